@@ -71,3 +71,23 @@ def topo_sort_subgraph(
         subgraph[node] = dependencies.get(node, set()) & subgraph_nodes
 
     return _topo_sort(subgraph)
+
+
+def topo_levels_subgraph(
+    start_nodes: set[int], dependencies: dict[int, set[int]]
+) -> list[list[int]]:
+    """Groups the topological sort into levels.
+
+    Nodes in a level only depend on nodes in earlier levels, so nodes within a
+    level may be run concurrently.
+    """
+    level_of: dict[int, int] = {}
+    for node in topo_sort_subgraph(start_nodes, dependencies):
+        level_of[node] = 1 + max(
+            (level_of[dep] for dep in dependencies.get(node, set())), default=-1
+        )
+
+    levels: list[list[int]] = [[] for _ in range(len(set(level_of.values())))]
+    for node, level in level_of.items():
+        levels[level].append(node)
+    return levels
@@ -30,3 +30,19 @@ class TestGraphAlgorithms(unittest.TestCase):
         self.assertEqual(
             graph_algorithms.topo_sort_subgraph({3, 4}, graph), [1, 2, 3, 4]
         )
+
+    def test_topo_levels(self):
+        graph = {
+            6: {4, 5},
+            5: {2},
+            4: {2},
+            3: {2},
+            2: {1},
+        }
+        self.assertEqual(
+            graph_algorithms.topo_levels_subgraph({6}, graph), [[1], [2], [4, 5], [6]]
+        )
+        self.assertEqual(
+            graph_algorithms.topo_levels_subgraph({3, 6}, graph),
+            [[1], [2], [3, 4, 5], [6]],
+        )
@@ -83,6 +83,9 @@ class AddedNode:
     # Update strategy for dependant nodes (if this node was run).
     update_deps: UpdateDeps = UpdateDeps.ALWAYS
 
+    # Nodes sharing a group are never run concurrently, e.g. "gpu".
+    concurrency_group: str | None = None
+
     # Note:
     # [normal] = not run_always + dependencies always.
     # passive = run_always + dependencies never, e.g. file names.
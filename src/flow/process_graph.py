@@ -1,7 +1,10 @@
+from concurrent import futures
 import dataclasses
+import hashlib
 import json
 import logging
 import os
+import threading
 import time
 
 from . import graph_algorithms
@@ -74,37 +77,118 @@ def _constant_node(name: str, value_type: Any) -> Type[process_node.ProcessNode]
     return _ConstantNode
 
 
+def _split_heavy_stages(
+    stages: list[list[internal_graph_node.AddedNode]],
+    heavy_nodes: list[internal_graph_node.AddedNode],
+) -> list[list[internal_graph_node.AddedNode]]:
+    """Splits stages so that each has at most one heavy node.
+
+    Resources are released after a stage with a heavy node. Otherwise all heavy
+    nodes of a level would stay loaded together until the level is done for
+    every item. Other nodes of the level stay with the first heavy node, so
+    they still run concurrently with it.
+    """
+    result: list[list[internal_graph_node.AddedNode]] = []
+    for stage in stages:
+        heavy = [node for node in stage if node in heavy_nodes]
+        if len(heavy) <= 1:
+            result.append(stage)
+            continue
+        light = [node for node in stage if node not in heavy_nodes]
+        result.append(light + heavy[:1])
+        result.extend([node] for node in heavy[1:])
+    return result
+
+
 class ProcessGraph:
     def __init__(self, dry_run: bool = False):
         self._dry_run = dry_run
         # Nodes with no dependents (used for running a subset of the graph).
         self._all_nodes: dict[int, internal_graph_node.AddedNode] = {}
         self._auto_save_path: str | None = None
+        # File whose results are currently held in memory, if any.
+        self._loaded_path: str | None = None
         # Used only for visualizing graph. NodeInstance handles actual call
         # dependencies.
         self._dependencies: dict[int, set[int]] = {}
+        # Sorted node ids by the final node ids. Cleared when the graph changes.
+        self._topo_sort_cache: dict[frozenset[int], list[int]] = {}
+        self._topo_levels_cache: dict[frozenset[int], list[list[int]]] = {}
+        # Nodes may finish concurrently in process_batch().
+        self._save_lock = threading.Lock()
+        # Digest and mtime of the content last read or written, by file path.
+        # Used to skip writing a file which already has the same content.
+        self._file_states: dict[str, tuple[bytes, int]] = {}
+        # Directories known to exist, to avoid repeated makedirs() calls.
+        self._created_dirs: set[str] = set()
 
     def _save_to(self, path: str):
         if self._dry_run:
             return
-        logging.info(f"Saving graph state to {path}")
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w") as f:
-            json.dump(self._results_dict, f, indent=2)
+        with self._save_lock:
+            content = json.dumps(self._results_dict, indent=2).encode()
+            digest = hashlib.blake2b(content).digest()
+            state = self._file_states.get(path)
+            # Only stat the file if the content matches.
+            if (
+                state is not None
+                and state[0] == digest
+                and state[1] == self._file_mtime(path)
+            ):
+                return
+            logging.info(f"Saving graph state to {path}")
+            dirname = os.path.dirname(path)
+            if dirname not in self._created_dirs:
+                os.makedirs(dirname, exist_ok=True)
+                self._created_dirs.add(dirname)
+            # Write and rename, so that a crash does not leave a partial file.
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.write(content)
+                f.flush()
+                # Renaming retains the mtime, so no need to stat the new file.
+                mtime = os.fstat(f.fileno()).st_mtime_ns
+            os.replace(temp_path, path)
+            self._file_states[path] = (digest, mtime)
+
+    @staticmethod
+    def _file_mtime(path: str) -> int:
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return -1
 
-    def persist(self, path: str):
+    def persist(self, path: str, constants: dict[int, Any] | None = None):
         """Sets a file where the results will be saved.
 
         This must be set before any computation (i.e. node.run()) is done.
         If the file exists, previous results will be loaded.
+
+        Args:
+            path: File to load and save the results.
+            constants: Values of constant nodes by node id, for the item whose
+              results are in the file. Binding them here keeps them in sync
+              with the loaded results.
         """
+        for node_id, value in (constants or {}).items():
+            self._all_nodes[node_id].set_value(value)
+        if path == self._loaded_path:
+            # Results in memory are already same as the file, skip reloading.
+            # This is common in process_batch(), which persists before each node.
+            self._auto_save_path = path
+            return
         self.reset()
         try:
-            with open(path) as f:
-                self._load_results_dict(json.load(f))
+            with open(path, "rb") as f:
+                content = f.read()
+                mtime = os.fstat(f.fileno()).st_mtime_ns
         except FileNotFoundError:
             pass
+        else:
+            self._load_results_dict(json.loads(content))
+            self._file_states[path] = (hashlib.blake2b(content).digest(), mtime)
         self._auto_save_path = path
+        self._loaded_path = path
 
     def _on_node_result(self, node: internal_graph_node.AddedNode, value_changed: bool):
         if self._auto_save_path is not None:
@@ -128,6 +212,7 @@ class ProcessGraph:
         force: bool = False,
         manual_override_func: internal_graph_node.ManualOverrideFuncT | None = None,
         default_arg_to_set: str | None = None,
+        concurrency_group: str | None = None,
     ) -> internal_graph_node.AddedNode:
         """Adds a processor node to the graph.
 
@@ -135,13 +220,14 @@ class ProcessGraph:
             id: An integer identifying the node. Prefer counting up from 0. Do not re-use deleted node ids.
             node_class: Class of the node to add.
             inputs: The inputs to the node. If PipelineNode, then it is output of that node. Other values are passed as-is.
-            version: Increment this when the node logic is changed, and it needs to be recomputed.
+            version: Increment this when the node logic is changed, and it needs to be recomputed. Alternatively pass node_class.source_hash() to recompute on any change to the class.
             passive: If True, will not trigger dependant nodes.
             constructor_kwargs: Passed directly to the node's class when it is instantiated.
             invalidate_before: Alternative to version, set this to a time when node logic was changed. Prefer version when possible.
             force: The node will be always recomputed. Use this sparingly, prefer other solutions when possible.
             manual_override_func: Change the output manually. Experimental - may become obsoleted.
             default_arg_to_set: What will be set if AddedNode.set() is called without arg=.
+            concurrency_group: Nodes with the same group are never run concurrently. Use for nodes sharing a limited resource, e.g. "gpu".
 
         Returns:
             A representation of the node. It can be passed to other nodes as input.
@@ -165,9 +251,12 @@ class ProcessGraph:
             manual_override_func=manual_override_func,
             dry_run=self._dry_run,
             default_arg_to_set=default_arg_to_set,
+            concurrency_group=concurrency_group,
         )
         self._all_nodes[id] = node_instance
         # Update DAG.
+        self._topo_sort_cache.clear()
+        self._topo_levels_cache.clear()
         self._dependencies[id] = set()
         for val in inputs.values():
             if isinstance(val, internal_graph_node.AddedNode):
@@ -206,11 +295,13 @@ class ProcessGraph:
 
     def reset(self):
         """Clear cached information."""
+        self._loaded_path = None
         for node_instance in self._all_nodes.values():
             node_instance.reset()
 
     def release_resources(self):
         """Clear the node and free up memory."""
+        self._loaded_path = None
         for node_instance in self._all_nodes.values():
             node_instance.release_resources()
 
@@ -258,16 +349,74 @@ class ProcessGraph:
             final_nodes: The nodes to be run finally. Only these nodes and their
             dependencies will be sorted.
         """
-        result: list[internal_graph_node.AddedNode] = []
-        for node_id in graph_algorithms.topo_sort_subgraph(
-            {x.id for x in final_nodes}, self._dependencies
-        ):
-            result.append(self._all_nodes[node_id])
-        return result
+        final_ids = frozenset(x.id for x in final_nodes)
+        if final_ids not in self._topo_sort_cache:
+            self._topo_sort_cache[final_ids] = graph_algorithms.topo_sort_subgraph(
+                set(final_ids), self._dependencies
+            )
+        return [
+            self._all_nodes[node_id] for node_id in self._topo_sort_cache[final_ids]
+        ]
+
+    def _topological_levels(
+        self,
+        final_nodes: list[internal_graph_node.AddedNode],
+    ) -> list[list[internal_graph_node.AddedNode]]:
+        """Same as _topological_sort(), but grouped into levels of independent nodes."""
+        final_ids = frozenset(x.id for x in final_nodes)
+        if final_ids not in self._topo_levels_cache:
+            self._topo_levels_cache[final_ids] = graph_algorithms.topo_levels_subgraph(
+                set(final_ids), self._dependencies
+            )
+        return [
+            [self._all_nodes[node_id] for node_id in level]
+            for level in self._topo_levels_cache[final_ids]
+        ]
 
     def _run_only(self, node: internal_graph_node.AddedNode) -> Any:
         return node.internal_run()
 
+    def _run_stage(
+        self, stage: list[internal_graph_node.AddedNode], max_workers: int
+    ) -> tuple[internal_graph_node.AddedNode, Exception] | None:
+        """Runs nodes which do not depend on each other.
+
+        Returns:
+            The first node which failed and its exception, or None on success.
+        """
+
+        def run_serially(
+            nodes: list[internal_graph_node.AddedNode],
+        ) -> tuple[internal_graph_node.AddedNode, Exception] | None:
+            for node in nodes:
+                try:
+                    self._run_only(node)
+                except Exception as exc:
+                    return node, exc
+            return None
+
+        if max_workers <= 1 or len(stage) == 1:
+            return run_serially(stage)
+
+        # Nodes of the same concurrency group run one after another in one task.
+        tasks: list[list[internal_graph_node.AddedNode]] = []
+        by_group: dict[str, list[internal_graph_node.AddedNode]] = {}
+        for node in stage:
+            if node.concurrency_group is None:
+                tasks.append([node])
+            elif node.concurrency_group in by_group:
+                by_group[node.concurrency_group].append(node)
+            else:
+                by_group[node.concurrency_group] = [node]
+                tasks.append(by_group[node.concurrency_group])
+
+        with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            outcomes = list(executor.map(run_serially, tasks))
+        for outcome in outcomes:
+            if outcome is not None:
+                return outcome
+        return None
+
     def process_batch(
         self,
         *,
@@ -278,6 +427,7 @@ class ProcessGraph:
         release_resources_after: list[internal_graph_node.AddedNode] | None = None,
         # TODO: Only if needed, replace or add faults_per_node_allowed.
         fault_tolerant: bool = True,
+        max_workers: int = 1,
     ) -> _BatchStats[_BatchItemT]:
         """Runs the nodes breath-first, for efficient resource managmement.
 
@@ -286,8 +436,9 @@ class ProcessGraph:
             run_nodes: The nodes which need computed. All dependant nodes will automatically be evaluated.
             prep_fn: Called before a node is run. This (1) must call graph.persist(FILE_BASED_ON_ITEM), and (2) should set constants.
             post_fn: Called after a node is run.
-            release_resources_after: Nodes which are used for heavy computation. When these are used, resources are freed up.
+            release_resources_after: Nodes which are used for heavy computation. When these are used, resources are freed up. With max_workers, each runs in its own stage, so that they are not loaded together.
             fault_tolerant: If True, will continue other items and summarize errors at the end. If False, will stop immediately if a node execution fails.
+            max_workers: If more than 1, nodes which do not depend on each other are run concurrently for each item, respecting their concurrency_group.
         """
 
         batch_result = _BatchStats[_BatchItemT](completed=0, failures=[])
@@ -295,10 +446,17 @@ class ProcessGraph:
         # Indexed by the items.
         indices_with_errors: set[int] = set()
 
-        nodes_to_run = self._topological_sort(run_nodes)
+        # Each stage is a list of nodes which can be run together.
+        stages: list[list[internal_graph_node.AddedNode]]
+        if max_workers > 1:
+            stages = _split_heavy_stages(
+                self._topological_levels(run_nodes), release_resources_after or []
+            )
+        else:
+            stages = [[node] for node in self._topological_sort(run_nodes)]
 
-        for node_index, node in enumerate(nodes_to_run):
-            is_last_node = node_index == len(nodes_to_run) - 1
+        for stage_index, stage in enumerate(stages):
+            is_last_stage = stage_index == len(stages) - 1
 
             for item_index, item in enumerate(batch_items):
                 if item_index in indices_with_errors:
@@ -311,9 +469,9 @@ class ProcessGraph:
                 if self._auto_save_path is None:
                     raise ValueError(f"persist() must be called in prep_fn")
 
-                try:
-                    self._run_only(node)
-                except Exception as exc:
+                failure = self._run_stage(stage, max_workers)
+                if failure is not None:
+                    node, exc = failure
                     if not fault_tolerant:
                         raise exc
                     logging.warning(
@@ -326,14 +484,14 @@ class ProcessGraph:
                     )
                     continue
 
-                if is_last_node:
+                if is_last_stage:
                     batch_result.completed += 1
 
                 if post_fn is not None:
                     post_fn(item_index, item)
 
             if release_resources_after is not None:
-                if node in release_resources_after:
+                if any(node in release_resources_after for node in stage):
                     # Free up resources for the next batch after using heavy nodes.
                     self.release_resources()
 
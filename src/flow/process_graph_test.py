@@ -1,6 +1,7 @@
 import json
 import os
 import tempfile
+import threading
 import time
 import unittest
 
@@ -165,6 +166,17 @@ class TestProcessGraph(unittest.TestCase):
         node1.set_value("world")
         self.assertEqual(graph.run_upto([node1]), "world")
 
+    def test_persist_with_constants(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graph = process_graph.ProcessGraph()
+            node1 = graph.add_constant_node(1, name="test_constant", type=int)
+            node2 = graph.add_node(2, SumInt, {"a": node1, "b": 1})
+            for value in [1, 2]:
+                graph.persist(
+                    os.path.join(temp_dir, f"persist{value}"), constants={1: value}
+                )
+                self.assertEqual(graph.run_upto([node2]), value + 1)
+
     def test_persistence(self):
         def make_graph():
             graph = process_graph.ProcessGraph()
@@ -198,6 +210,14 @@ class TestProcessGraph(unittest.TestCase):
         self.assertEqual(graph._topological_sort([node2]), [node1, node2])
         self.assertEqual(graph._topological_sort([node2, node3]), [node1, node2, node3])
 
+        # Sorts remain correct as nodes are added.
+        node4 = graph.add_node(4, SumInt, {"a": node1, "b": node3})
+        self.assertEqual(graph._topological_sort([node4]), [node1, node2, node3, node4])
+        self.assertEqual(
+            graph._topological_levels([node2, node4]),
+            [[node1], [node2], [node3], [node4]],
+        )
+
     def test_node_with_init_args(self):
         graph = process_graph.ProcessGraph()
         node1 = graph.add_node(
@@ -325,6 +345,162 @@ class TestProcessGraph(unittest.TestCase):
                 fault_tolerant=False,  # On error, do not continue.
             )
 
+    def test_persist_same_path_skips_reload(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            persist_path = os.path.join(temp_dir, "persist")
+            graph = process_graph.ProcessGraph()
+            node1 = graph.add_node(1, SumInt, {"a": 1, "b": 2})
+            graph.persist(persist_path)
+            graph.run_upto([node1])
+
+            # The results in memory are reused, without reading the file.
+            os.remove(persist_path)
+            graph.persist(persist_path)
+            self.assertEqual(node1.result, 3)
+
+            # Once the graph is reset, the file is read again.
+            graph.release_resources()
+            graph.persist(persist_path)
+            self.assertFalse(node1.has_result())
+
+    def test_save_skips_unchanged(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            persist_path = os.path.join(temp_dir, "persist")
+            graph = process_graph.ProcessGraph()
+            node1 = graph.add_node(1, SumInt, {"a": 1, "b": 2})
+            graph.persist(persist_path)
+            graph.run_upto([node1])
+            mtime = os.stat(persist_path).st_mtime_ns
+
+            # Same content is not written again.
+            time.sleep(0.01)
+            graph._save_to(persist_path)
+            self.assertEqual(os.stat(persist_path).st_mtime_ns, mtime)
+
+            # But it is, if the file is gone.
+            os.remove(persist_path)
+            graph._save_to(persist_path)
+            self.assertTrue(os.path.exists(persist_path))
+
+    def test_batch_process_concurrent(self):
+        # Tracks how many nodes of the "shared" group are running at once.
+        lock = threading.Lock()
+        active = [0]
+        max_active = [0]
+
+        class SharedResourceNode(process_node.ProcessNode):
+            @override
+            def process(self, a: int, b: int) -> int:
+                with lock:
+                    active[0] += 1
+                    max_active[0] = max(max_active[0], active[0])
+                time.sleep(0.01)
+                with lock:
+                    active[0] -= 1
+                return a + b
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graph = process_graph.ProcessGraph()
+            const = graph.add_constant_node(1, name="test_constant", type=int)
+            branches = [
+                graph.add_node(
+                    i,
+                    SharedResourceNode,
+                    {"a": const, "b": i},
+                    concurrency_group="shared",
+                )
+                for i in range(2, 5)
+            ]
+            branches.append(graph.add_node(5, SumInt, {"a": const, "b": 5}))
+            final = graph.add_node(6, SumInt, {"a": branches[0], "b": branches[-1]})
+
+            def prep_fn(index: int, item: Any) -> None:
+                const.set("value", item)
+                graph.persist(os.path.join(temp_dir, "persist" + str(index)))
+
+            stats = graph.process_batch(
+                batch_items=[10, 20],
+                run_nodes=[final] + branches,
+                prep_fn=prep_fn,
+                max_workers=4,
+            )
+
+            graph.persist(os.path.join(temp_dir, "persist1"))
+            self.assertEqual(
+                [graph._results_dict[i]["output"] for i in range(1, 7)],
+                [20, 22, 23, 24, 25, 47],
+            )
+
+        self.assertEqual(stats.completed, 2)
+        self.assertEqual(max_active[0], 1)
+
+    def test_batch_process_concurrent_releases_heavy_nodes(self):
+        # Tracks how many heavy nodes are loaded at once.
+        loaded = [0]
+        max_loaded = [0]
+
+        class HeavyNode(process_node.ProcessNode):
+            def __init__(self) -> None:
+                loaded[0] += 1
+                max_loaded[0] = max(max_loaded[0], loaded[0])
+
+            @override
+            def process(self, a: int, b: int) -> int:
+                return a + b
+
+            @override
+            def finalize(self) -> None:
+                loaded[0] -= 1
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            graph = process_graph.ProcessGraph()
+            const = graph.add_constant_node(1, name="test_constant", type=int)
+            heavy = [
+                graph.add_node(
+                    i, HeavyNode, {"a": const, "b": i}, concurrency_group="shared"
+                )
+                for i in range(2, 5)
+            ]
+            light = graph.add_node(5, SumInt, {"a": const, "b": 5})
+
+            def prep_fn(index: int, item: Any) -> None:
+                const.set("value", item)
+                graph.persist(os.path.join(temp_dir, "persist" + str(index)))
+
+            stats = graph.process_batch(
+                batch_items=[10, 20],
+                run_nodes=heavy + [light],
+                prep_fn=prep_fn,
+                release_resources_after=heavy,
+                max_workers=4,
+            )
+
+        self.assertEqual(stats.completed, 2)
+        self.assertEqual(max_loaded[0], 1)
+        self.assertEqual(loaded[0], 0)
+
+    def test_source_hash_version(self):
+        self.assertEqual(SumInt.source_hash(), SumInt.source_hash())
+        self.assertNotEqual(SumInt.source_hash(), Inc.source_hash())
+
+        graph = process_graph.ProcessGraph()
+        node1 = graph.add_node(
+            1, SumInt, {"a": 1, "b": 2}, version=SumInt.source_hash()
+        )
+        sum_node1: SumInt = node1._node  # pyright: ignore
+        graph.run_upto([node1])
+
+        # Simulate save and reload. No recompute if the source is unchanged.
+        node1.from_persist(node1.to_persist())
+        graph.run_upto([node1])
+        self.assertEqual(sum_node1.process_call_count, 1)
+
+        # Recompute if the source changes.
+        node1.from_persist(node1.to_persist())
+        node1.version = Inc.source_hash()
+        graph.run_upto([node1])
+        self.assertEqual(sum_node1.process_call_count, 2)
+
     def test_passive(self):
         graph = process_graph.ProcessGraph()
         # Since constant nodes are passive, we can instantiate one for testing.
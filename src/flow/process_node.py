@@ -1,4 +1,5 @@
 import abc
+import hashlib
 import inspect
 
 from . import type_util
@@ -32,6 +33,19 @@ class ProcessNode(abc.ABC):
         # changes, or there is collision.
         return cls.__name__
 
+    @classmethod
+    def source_hash(cls) -> str:
+        """Hash of the class's source code.
+
+        This can be passed as version= to graph.add_node(), so that the node is
+        recomputed whenever its code changes, without bumping version manually.
+
+        Note that only the class body is hashed. Changes to module level helpers
+        or imported modules are not detected.
+        """
+        source = inspect.getsource(cls)
+        return hashlib.blake2b(source.encode(), digest_size=6).hexdigest()
+
     def validate_args(self, kwargs) -> None:
         """Validates kwargs against the overridden process()'s signature.
 
@@ -1,5 +1,6 @@
 import dataclasses
 import enum
+import operator
 import re
 
 from typing import TypedDict
@@ -8,8 +9,17 @@ from typing import TypedDict
 _PHONE_REGEX = re.compile(r"\+?\d{0,3} ?\(\d{3}\) ?\d{3} ?\-?\d{4}")
 # _PHONE_REGEX = re.compile(r"\+?\d{0,3} ?\(?\d{3}\)? ?\d{3} ?\-?\d{4}")
 
+# Boxes within this many pixels on each field are considered the same.
+_PIXEL_THRESHOLD = 5
+_BOX_FIELDS = operator.itemgetter("top", "left", "width", "height")
+_BOX_SORT_KEY = operator.itemgetter("top", "left")
+
 
 def is_phone_number(text: str) -> bool:
+    # Most OCR text has no parentheses, which _PHONE_REGEX requires. Reject
+    # those with a quick substring check before running the regex.
+    if "(" not in text:
+        return False
     return bool(_PHONE_REGEX.match(text))
 
 
@@ -34,12 +44,13 @@ class DetectionResult:
 
 
 def _box_almost_equal(box1: Bbox, box2: Bbox) -> bool:
-    pixel_threshold = 5
+    top1, left1, width1, height1 = _BOX_FIELDS(box1)
+    top2, left2, width2, height2 = _BOX_FIELDS(box2)
     return (
-        abs(box1["top"] - box2["top"]) < pixel_threshold
-        and abs(box1["left"] - box2["left"]) < pixel_threshold
-        and abs(box1["width"] - box2["width"]) < pixel_threshold
-        and abs(box1["height"] - box2["height"]) < pixel_threshold
+        abs(top1 - top2) < _PIXEL_THRESHOLD
+        and abs(left1 - left2) < _PIXEL_THRESHOLD
+        and abs(width1 - width2) < _PIXEL_THRESHOLD
+        and abs(height1 - height2) < _PIXEL_THRESHOLD
     )
 
 
@@ -48,8 +59,8 @@ def boxes_almost_equal(boxes1: list[Bbox], boxes2: list[Bbox]) -> bool:
         return False
 
     # Sort the boxes by top and left.
-    boxes1.sort(key=lambda x: (x["top"], x["left"]))
-    boxes2.sort(key=lambda x: (x["top"], x["left"]))
+    boxes1.sort(key=_BOX_SORT_KEY)
+    boxes2.sort(key=_BOX_SORT_KEY)
 
     for box1, box2 in zip(boxes1, boxes2):
         if not _box_almost_equal(box1, box2):
@@ -1,12 +1,26 @@
 import abc
+import hashlib
+import json
 import logging
+import os
 import pathlib
+import tempfile
 import time
 
 from typing import Any, Callable
 
 _NUM_RETRIES = 3
 
+# Used to convert a response to JSON, if a json_formatter is given.
+_FORMAT_AS_JSON_PROMPT = "\n".join(
+    [
+        "Convert the following response into JSON, as per the schema.",
+        "Do not change, add or remove any of the content.",
+        "",
+        "{response}",
+    ]
+)
+
 
 class RetriableException(Exception):
     """Raised when an LLM call fails and should be retried.
@@ -31,6 +45,22 @@ class AbstractLlm(abc.ABC):
         """Gets LLM response."""
         pass
 
+    def supports_prediction(self) -> bool:
+        """Whether do_prompt() accepts a `prediction` of the response text."""
+        return False
+
+    def supports_streaming(self) -> bool:
+        """Whether do_prompt() accepts an `on_token` callback."""
+        return False
+
+    def supports_json_schema(self) -> bool:
+        """Whether do_prompt() accepts a `json_schema` to constrain the response."""
+        return False
+
+    def supports_prompt_cache_key(self) -> bool:
+        """Whether do_prompt() accepts a `prompt_cache_key`."""
+        return False
+
     def _log_llm_debug_info(
         self,
         *,
@@ -75,6 +105,11 @@ class AbstractLlm(abc.ABC):
         log_file: str | pathlib.Path | None = None,
         log_additional_info: str | None = None,
         image_b64: str | None = None,
+        stream_file: str | pathlib.Path | None = None,
+        json_schema: dict[str, Any] | None = None,
+        json_formatter: "AbstractLlm | None" = None,
+        cache_dir: str | pathlib.Path | None = None,
+        prompt_cache_key: str | None = None,
     ) -> Any:
         """Gets LLM response, then validates and transforms it.
 
@@ -92,21 +127,117 @@ class AbstractLlm(abc.ABC):
             log_additional_info: Information to be added to the log file.
 
             image_b64: Optional image as part of the query.
+
+            stream_file: If given, the raw response is written to this file as
+            it arrives, if the implementation supports streaming. It is written
+            to a ".partial" file first, and moved here once it parses.
+
+            json_schema: If given, the LLM is constrained to respond with JSON
+            following this schema, if the implementation supports it.
+
+            json_formatter: If given, the response is not constrained to the
+            json_schema. Instead this LLM is asked to convert the response to
+            JSON following the schema. Use a cheap model, so that the main
+            model can reason without being restricted to JSON. If it supports
+            predictions, the response is passed as one.
+
+            cache_dir: If given, responses are cached in this directory, keyed
+            by the model and the query. A cached response is reused if it
+            parses successfully with the transformers.
+
+            prompt_cache_key: If given, tells the provider that prompts with the
+            same key share a prefix, so that it can reuse its cached processing
+            of that prefix. Ignored if the implementation does not support it.
         """
+        cache_file: pathlib.Path | None = None
+        # Cached responses as {"response": ..., "formatted": ...}.
+        cached: dict[str, Any] | None = None
+        if cache_dir is not None:
+            cache_key = {
+                "model": self.model_description(),
+                "prompt": prompt,
+                "max_tokens": max_tokens,
+                "image_b64": image_b64,
+                "json_schema": json_schema,
+                "json_formatter": (
+                    None
+                    if json_formatter is None
+                    else json_formatter.model_description()
+                ),
+            }
+            cache_hash = hashlib.sha256(
+                json.dumps(cache_key, sort_keys=True).encode()
+            ).hexdigest()
+            cache_file = pathlib.Path(cache_dir) / f"{cache_hash}.json"
+            try:
+                with open(cache_file) as f:
+                    cached = json.load(f)
+            except FileNotFoundError:
+                pass
+            except json.JSONDecodeError:
+                logging.warning(f"Ignoring corrupt LLM cache {cache_file}")
+
+        partial_file: str | None = None
+        if stream_file is not None and self.supports_streaming():
+            partial_file = f"{stream_file}.partial"
+
+        response: Any = None
+        formatted_response: Any = None
         retries_left = _NUM_RETRIES
         logging.info(f"Sending prompt: {prompt}")
         while True:
-            retries_left -= 1
-            # Pass on the image= arg only if it is given.
+            is_cached = cached is not None
+            # A cached response that does not parse does not use up a retry.
+            if not is_cached:
+                retries_left -= 1
+            # Pass on the optional args only if they are given.
             extra_kwargs = {}
             if image_b64 is not None:
                 extra_kwargs.update(image_b64=image_b64)
+            if (
+                json_schema is not None
+                and json_formatter is None
+                and self.supports_json_schema()
+            ):
+                extra_kwargs.update(json_schema=json_schema)
+            if prompt_cache_key is not None and self.supports_prompt_cache_key():
+                extra_kwargs.update(prompt_cache_key=prompt_cache_key)
 
             try:
-                response: Any = self.do_prompt(
-                    prompt, max_tokens=max_tokens, **extra_kwargs
-                )
-                processed_response = response
+                if cached is not None:
+                    logging.info(f"Using cached LLM response from {cache_file}")
+                    response = cached["response"]
+                    formatted_response = cached["formatted"]
+                    # Query the LLM if this does not parse.
+                    cached = None
+                elif partial_file is None:
+                    response = self.do_prompt(
+                        prompt, max_tokens=max_tokens, **extra_kwargs
+                    )
+                else:
+                    # Overwritten, so that a retry does not append to a failed one.
+                    with open(partial_file, "w") as f:
+                        response = self.do_prompt(
+                            prompt,
+                            max_tokens=max_tokens,
+                            on_token=f.write,
+                            **extra_kwargs,
+                        )
+                if not is_cached:
+                    formatted_response = response
+                    if json_formatter is not None:
+                        formatter_kwargs = {}
+                        if json_formatter.supports_json_schema():
+                            formatter_kwargs.update(json_schema=json_schema)
+                        if json_formatter.supports_prediction():
+                            # The formatted response mostly repeats the response.
+                            formatter_kwargs.update(prediction=response)
+                        formatted_response = json_formatter.do_prompt(
+                            _FORMAT_AS_JSON_PROMPT.format(response=response),
+                            max_tokens=max_tokens,
+                            **formatter_kwargs,
+                        )
+                processed_response = formatted_response
                 for parser in transformers:
                     processed_response = parser(processed_response)
             except RetriableException as e:
@@ -119,6 +250,23 @@ class AbstractLlm(abc.ABC):
                 time.sleep(e.retry_delay_s)
                 continue
 
+            if partial_file is not None and not is_cached:
+                assert stream_file is not None
+                os.replace(partial_file, stream_file)
+
+            if cache_file is not None and not is_cached:
+                os.makedirs(cache_file.parent, exist_ok=True)
+                # Write and rename, so that a crash or a concurrent node does
+                # not leave a partial file.
+                temp_fd, temp_file = tempfile.mkstemp(
+                    dir=cache_file.parent, suffix=".tmp"
+                )
+                with os.fdopen(temp_fd, "w") as f:
+                    json.dump(
+                        {"response": response, "formatted": formatted_response}, f
+                    )
+                os.replace(temp_file, cache_file)
+
             self._log_llm_debug_info(
                 log_fname=log_file,
                 prompt=prompt,
@@ -1,3 +1,4 @@
+import functools
 import json
 import logging
 import os
@@ -11,7 +12,7 @@ from . import abstract_llm
 from . import local_server
 from . import openai_utils
 
-from typing import Final, override
+from typing import Any, Callable, Final, override
 
 # DO NOT SET THIS TO FALSE HERE.
 # Use `--no-start-llm-server` command line argument to disable auto-starting.
@@ -23,6 +24,7 @@ _LLAMA_PORT = 8080
 def _query_llama(
     prompt,
     max_tokens: int,
+    on_token: Callable[[str], object] | None = None,
 ) -> str:
     server_url = f"http://localhost:{_LLAMA_PORT}"
     # Payload Documentation: https://platform.openai.com/docs/api-reference/responses-streaming/response/incomplete
@@ -52,6 +54,8 @@ def _query_llama(
                     data = json.loads(json_str)
                     print(data["content"], file=sys.stderr, end="", flush=True)
                     response_chunks.append(data["content"])
+                    if on_token is not None:
+                        on_token(data["content"])
         print(file=sys.stderr)  # Newline.
         return "".join(response_chunks)
     except requests.exceptions.RequestException as e:
@@ -109,6 +113,10 @@ class LocalLlmInstance(abstract_llm.AbstractLlm):
             f"Unknown how to decorate prompt for model: {self.model_description()}"
         )
 
+    @override
+    def supports_streaming(self) -> bool:
+        return True
+
     @override
     def do_prompt(self, prompt: str, **kwargs) -> str:
         response = _query_llama(self._decorate_prompt(prompt), **kwargs)
@@ -119,6 +127,13 @@ class LocalLlmInstance(abstract_llm.AbstractLlm):
         self._server_instance.terminate()
 
 
+@functools.cache
+def _openai_client(api_key: str) -> openai.OpenAI:
+    # The client is thread-safe. Sharing it lets LLM nodes running concurrently
+    # reuse the connections in its pool, instead of each opening their own.
+    return openai.OpenAI(api_key=api_key)
+
+
 class OpenAiLlmInstance(abstract_llm.AbstractLlm):
     def __init__(self, model_id: str):
         # Really this needs to be done once, but it is idempotent, and for
@@ -126,7 +141,7 @@ class OpenAiLlmInstance(abstract_llm.AbstractLlm):
         dotenv.load_dotenv()
 
         self.model_id: Final[str] = model_id
-        self._client = openai.OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+        self._client = _openai_client(os.environ["OPENAI_API_KEY"])
 
     @override
     def model_description(self) -> str:
@@ -134,12 +149,40 @@ class OpenAiLlmInstance(abstract_llm.AbstractLlm):
         return f"OpenAI {self.model_id}"
 
     @override
-    def do_prompt(self, prompt: str, max_tokens: int) -> str:
+    def supports_prediction(self) -> bool:
+        return openai_utils.supports_prediction(self.model_id)
+
+    @override
+    def supports_streaming(self) -> bool:
+        return True
+
+    @override
+    def supports_json_schema(self) -> bool:
+        return True
+
+    @override
+    def supports_prompt_cache_key(self) -> bool:
+        return True
+
+    @override
+    def do_prompt(
+        self,
+        prompt: str,
+        max_tokens: int,
+        on_token: Callable[[str], object] | None = None,
+        json_schema: dict[str, Any] | None = None,
+        prediction: str | None = None,
+        prompt_cache_key: str | None = None,
+    ) -> str:
         return openai_utils.streamed_openai_response(
             client=self._client,
             max_completion_tokens=max_tokens,
             model=self.model_id,
             messages=[{"role": "user", "content": prompt}],
+            on_token=on_token,
+            json_schema=json_schema,
+            prediction=prediction,
+            prompt_cache_key=prompt_cache_key,
         )
 
 
@@ -9,24 +9,61 @@ from openai.types import responses
 from . import abstract_llm
 from . import openai_type_helper
 
+from typing import Any, Callable
+
 # Default is True, which uses streaming mode to echo responses to stderr.
 _USE_STREAMING_ALWAYS = True
 
 # These model(s) raise error, saying that the organization must be verified if streaming is attempted.
 _NON_STREAMABLE_MODELS = {"o3"}
 
+# Models which accept predicted outputs.
+_PREDICTION_MODEL_PREFIXES = ("gpt-4o", "gpt-4.1")
+
+
+def supports_prediction(model: str) -> bool:
+    return model.startswith(_PREDICTION_MODEL_PREFIXES)
+
+
+def _json_schema_format(json_schema: dict[str, Any]) -> dict[str, Any]:
+    # Strict mode makes the server guarantee that the response follows the schema.
+    return {"name": "response", "schema": json_schema, "strict": True}
+
+
+def _prompt_cache_kwargs(prompt_cache_key: str | None) -> dict[str, Any]:
+    # Older openai releases do not accept prompt_cache_key at all.
+    if prompt_cache_key is None:
+        return {}
+    return {"prompt_cache_key": prompt_cache_key}
+
+
+def _prediction_kwargs(
+    max_completion_tokens: int, prediction: str | None
+) -> dict[str, Any]:
+    if prediction is None:
+        return {"max_completion_tokens": max_completion_tokens}
+    # Predicted outputs do not support max_completion_tokens.
+    return {"prediction": {"type": "content", "content": prediction}}
+
 
 def _non_streamed_openai_response(
     client: openai.OpenAI,
     model: str,
     messages: responses.ResponseInputParam,
+    json_schema: dict[str, Any] | None = None,
+    prompt_cache_key: str | None = None,
 ) -> str:
 
+    text: Any = openai.NOT_GIVEN
+    if json_schema is not None:
+        text = {"format": {"type": "json_schema", **_json_schema_format(json_schema)}}
     response = client.responses.create(
         model=model,
         input=messages,
         # reasoning={"effort": "high"},  # you can choose "low", "medium", "high"
         background=False,
+        text=text,
+        **_prompt_cache_kwargs(prompt_cache_key),
     )
     logging.info(f"Query response: {response.output_text}")
     return response.output_text
@@ -38,25 +75,50 @@ def streamed_openai_response(
     model: str,
     max_completion_tokens: int,
     messages: list[chat.ChatCompletionMessageParam],
+    on_token: Callable[[str], object] | None = None,
+    json_schema: dict[str, Any] | None = None,
+    prediction: str | None = None,
+    prompt_cache_key: str | None = None,
 ) -> str:
     """Replacement for client.responses.create.
 
     Except, it echoes the response to stderr in as it comes in real time.
+    If on_token is given, it is also called with each piece of the response.
+    If json_schema is given, the response is constrained to JSON following it.
+    If prediction is given, it is sent as the expected output, which speeds up
+    responses that largely match it. See supports_prediction().
+    If prompt_cache_key is given, requests with the same key are routed
+    together, which improves the prompt cache hits for their common prefix.
     """
     if not _USE_STREAMING_ALWAYS or model in _NON_STREAMABLE_MODELS:
         # TODO: Implement compile-time checks if possible?
         # I think run-time checks will be done by OpenAI.
         # These two are very similar.
-        return _non_streamed_openai_response(
-            client, model, openai_type_helper.chatcompletion_to_responseinput(messages)
+        response = _non_streamed_openai_response(
+            client,
+            model,
+            openai_type_helper.chatcompletion_to_responseinput(messages),
+            json_schema=json_schema,
+            prompt_cache_key=prompt_cache_key,
         )
+        if on_token is not None:
+            on_token(response)
+        return response
 
+    response_format: Any = openai.NOT_GIVEN
+    if json_schema is not None:
+        response_format = {
+            "type": "json_schema",
+            "json_schema": _json_schema_format(json_schema),
+        }
     try:
         stream = client.chat.completions.create(
             model=model,
             messages=messages,
             stream=True,
-            max_completion_tokens=max_completion_tokens,
+            response_format=response_format,
+            **_prompt_cache_kwargs(prompt_cache_key),
+            **_prediction_kwargs(max_completion_tokens, prediction),
         )
         tokens: list[str] = []
         logging.info(f"Streaming response to stderr:")
@@ -66,6 +128,8 @@ def streamed_openai_response(
             if token is not None:
                 tokens.append(token)
                 print(token, end="", flush=True)
+                if on_token is not None:
+                    on_token(token)
     except openai.BadRequestError as e:
         if "must be verified to stream" in e.message:
             logging.error("Note to developer: Try adding the model to _NON_STREAMABLE.")
@@ -3,6 +3,7 @@ import hashlib
 import json
 import os
 
+import orjson
 import pydantic
 
 from . import video_graph_node_getter
@@ -22,8 +23,8 @@ class HighlightData(pydantic.BaseModel):
 
     @functools.cached_property
     def captions(self) -> list[role_based_captioner.RoleAwareCaptionT]:
-        with open(self.captions_file, "r") as file:
-            return json.load(file)
+        with open(self.captions_file, "rb") as file:
+            return orjson.loads(file.read())
 
     @property
     def duration(self) -> float:
@@ -153,8 +154,10 @@ class EvalsPersister(process_node.ProcessNode):
                 err=f"Highlights node not computed for {video_fname}",
             )
 
-            with open(highlights_node_result, "r") as file:
-                evaluations: list[video_flow_types.HighlightsT] = json.load(file)
+            with open(highlights_node_result, "rb") as file:
+                evaluations: list[video_flow_types.HighlightsT] = orjson.loads(
+                    file.read()
+                )
                 for evaluation in evaluations:
                     # Sometimes the comment is not capitalized in LLM output.
                     evaluation["comment"] = evaluation["comment"].capitalize()
@@ -170,13 +173,14 @@ class EvalsPersister(process_node.ProcessNode):
         out_file_basename = f"segments_{student or teacher}_{fingerprint}.json"
         out_fname = os.path.join(log_dir, out_file_basename)
 
-        with open(out_fname, "w") as f:
-            json.dump(
-                {
-                    "segments": eval_segments.model_dump(),
-                    "fingerprint": fingerprint,
-                },
-                f,
+        with open(out_fname, "wb") as f:
+            f.write(
+                orjson.dumps(
+                    {
+                        "segments": eval_segments.model_dump(),
+                        "fingerprint": fingerprint,
+                    }
+                )
             )
 
         return out_fname
@@ -26,7 +26,7 @@ class HiringMovieCompiler(process_node.ProcessNode):
         movie_type: video_flow_types.CompilationType,
         highlights_log_file: str,
     ) -> str:
-        with open(highlights_log_file, "r") as file:
+        with open(highlights_log_file, "rb") as file:
             highlights_log = hhc.HighlightsLog.model_validate_json(file.read())
 
         self._compile_movie(
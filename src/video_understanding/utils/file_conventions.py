@@ -102,7 +102,8 @@ class BadFilePattern(ValueError):
     pass
 
 
-@dataclasses.dataclass
+# Frozen, since parsed instances are shared through the cache.
+@dataclasses.dataclass(frozen=True)
 class FileNameComponents:
     date: str
     student: str
@@ -110,6 +111,7 @@ class FileNameComponents:
     session: str
 
     @classmethod
+    @functools.lru_cache(maxsize=256)
     def from_pathname(cls, pathname: str) -> "FileNameComponents":
         try:
             match = _staggered_fullmatch(_FILE_RE_STAGGERED, os.path.basename(pathname))
@@ -0,0 +1,121 @@
+import collections
+import time
+
+import cv2
+from numpy import typing as npt
+import numpy as np
+
+# Number of recently decoded frames to keep.
+_FRAME_CACHE_SIZE = 8
+
+# Up to how many seconds ahead to decode sequentially, instead of seeking.
+# Used until both have been timed on the video.
+_MAX_SEQUENTIAL_READ_S = 2.0
+
+
+class FrameReader:
+    """Random access to video frames, with minimal decoding.
+
+    Reading ahead decodes sequentially, unless seeking is expected to be
+    faster. Seeks use the container index, i.e. they decode only from the
+    previous keyframe. Which one is faster depends on the keyframe interval of
+    the video, so both are timed as they happen.
+    Recently read frames are cached, since refinement revisits nearby times.
+    """
+
+    def __init__(self, source_file: str) -> None:
+        self._cap = cv2.VideoCapture(source_file)
+        if not self._cap.isOpened():
+            raise ValueError(f"Could not open {source_file!r}")
+        self._fps: float = self._cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        # Approximate. The frame count is estimated by OpenCV, and can overshoot.
+        # Reads past the actual end return the last frame.
+        self.duration = frame_count / self._fps
+        # Index of the last decodable frame, once reading past it has failed.
+        self._last_index: int | None = None
+        # Index of the frame that the next read() will return, if known.
+        self._next_index: int | None = 0
+        self._cache: collections.OrderedDict[int, npt.NDArray[np.uint8]] = (
+            collections.OrderedDict()
+        )
+        # Total time and count of frames decoded sequentially, and of seeks.
+        self._grab_time = 0.0
+        self._grab_count = 0
+        self._seek_time = 0.0
+        self._seek_count = 0
+
+    def _should_seek(self, skip: int) -> bool:
+        if skip < 0:
+            return True
+        if self._grab_count == 0 or self._seek_count == 0:
+            return skip > _MAX_SEQUENTIAL_READ_S * self._fps
+        grab_cost = skip * self._grab_time / self._grab_count
+        return grab_cost > self._seek_time / self._seek_count
+
+    def get_frame(self, t: float) -> npt.NDArray[np.uint8]:
+        """Returns the RGB frame at time t, like moviepy's get_frame()."""
+        # Same frame indexing as moviepy.
+        index = int(self._fps * t + 0.00001)
+        if self._last_index is not None:
+            # Like moviepy, clamp to the last frame.
+            index = min(index, self._last_index)
+        frame = self._cache.get(index)
+        if frame is not None:
+            self._cache.move_to_end(index)
+            return frame
+
+        bgr_frame = self._read(index)
+        if bgr_frame is None:
+            if self._last_index is not None:
+                raise ValueError(f"Could not read frame {index} at {t}s")
+            self._last_index = self._find_last_index(index)
+            return self.get_frame(t)
+
+        frame = cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB)
+        self._cache[index] = frame
+        if len(self._cache) > _FRAME_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return frame
+
+    def _read(self, index: int) -> npt.NDArray[np.uint8] | None:
+        """Decodes the BGR frame at index, or returns None past the end."""
+        start = time.monotonic()
+        if self._next_index is None or self._should_seek(index - self._next_index):
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ok, bgr_frame = self._cap.read()
+            self._seek_time += time.monotonic() - start
+            self._seek_count += 1
+        else:
+            skip = index - self._next_index
+            for _ in range(skip):
+                self._cap.grab()
+            ok, bgr_frame = self._cap.read()
+            self._grab_time += time.monotonic() - start
+            self._grab_count += skip + 1
+        if not ok:
+            # Position is unknown after a failed read, so the next read seeks.
+            self._next_index = None
+            return None
+        self._next_index = index + 1
+        return bgr_frame
+
+    def _find_last_index(self, end: int) -> int:
+        """Finds the last decodable frame, given that the one at end is not."""
+        # Step back exponentially until a frame decodes.
+        step = 1
+        while True:
+            good = max(end - step, 0)
+            if self._read(good) is not None:
+                break
+            if good == 0:
+                raise ValueError("Could not read any frame")
+            end = good
+            step *= 2
+        # Then read forward to the last frame that decodes.
+        while good + 1 < end and self._read(good + 1) is not None:
+            good += 1
+        return good
+
+    def close(self) -> None:
+        self._cap.release()
@@ -9,6 +9,9 @@ If this assumption did not hold, we'd need to use interval_tree data structure w
 import heapq
 import itertools
 
+from numpy import typing as npt
+import numpy as np
+
 from typing import Generic, Sequence, TypedDict, TypeVar
 
 _EPSILON = 1e-5
@@ -67,3 +70,44 @@ class IntervalScanner(Generic[T]):
     def containing_timestamp(self, time: float) -> list[T]:
         """Search for intervals which contain the given timestamp."""
         return self.overlapping_intervals(time, time)
+
+
+class IntervalIndex(Generic[T]):
+    """Stateless lookup of overlapping intervals, without monotonic scans.
+
+    Starts and running-maximum ends are kept as sorted arrays, so each query
+    is a pair of binary searches followed by a scan of the candidate slice.
+    """
+
+    def __init__(
+        self,
+        intervals: Sequence[T],
+    ):
+        self._intervals = sorted(intervals, key=lambda x: x["interval"][0])
+        self._starts = np.array(
+            [x["interval"][0] for x in self._intervals], dtype=float
+        )
+        self._ends = np.array([x["interval"][1] for x in self._intervals], dtype=float)
+        # Non-decreasing, so that it can be binary searched even when intervals
+        # overlap.
+        self._max_ends = np.maximum.accumulate(self._ends)
+
+    def overlapping_intervals(self, start: float, end: float) -> list[T]:
+        """Search for intervals overlapping with (start, end), sorted by start."""
+        lo = int(np.searchsorted(self._max_ends, start - _EPSILON, side="left"))
+        hi = int(np.searchsorted(self._starts, end + _EPSILON, side="right"))
+        return [
+            self._intervals[i]
+            for i in range(lo, hi)
+            if self._ends[i] >= start - _EPSILON
+        ]
+
+    def overlaps_any(
+        self, starts: npt.NDArray[np.float64], ends: npt.NDArray[np.float64]
+    ) -> npt.NDArray[np.bool_]:
+        """For each (starts[i], ends[i]), checks if any interval overlaps it."""
+        hi = np.searchsorted(self._starts, ends + _EPSILON, side="right")
+        if not self._intervals:
+            return np.zeros(len(starts), dtype=np.bool_)
+        max_ends = self._max_ends[np.maximum(hi - 1, 0)]
+        return (hi > 0) & (max_ends >= starts - _EPSILON)
@@ -1,5 +1,7 @@
 import unittest
 
+import numpy as np
+
 from ..utils import interval_scanner
 
 
@@ -99,3 +101,50 @@ class TestIntervalScanner(unittest.TestCase):
                 {"interval": (0, 100)},
             ],
         )
+
+
+class TestIntervalIndex(unittest.TestCase):
+    def test_overlapping_intervals(self):
+        index = interval_scanner.IntervalIndex(
+            [
+                {"interval": (10, 20)},
+                {"interval": (0, 100)},
+                {"interval": (11, 12)},
+                {"interval": (30, 40)},
+            ]
+        )
+        self.assertEqual(
+            index.overlapping_intervals(13, 15),
+            [{"interval": (0, 100)}, {"interval": (10, 20)}],
+        )
+        # Queries need not be monotonic.
+        self.assertEqual(
+            index.overlapping_intervals(35, 120),
+            [{"interval": (0, 100)}, {"interval": (30, 40)}],
+        )
+        self.assertEqual(
+            index.overlapping_intervals(11.5, 11.5),
+            [{"interval": (0, 100)}, {"interval": (10, 20)}, {"interval": (11, 12)}],
+        )
+        self.assertEqual(index.overlapping_intervals(101, 102), [])
+
+    def test_overlaps_any(self):
+        index = interval_scanner.IntervalIndex(
+            [
+                {"interval": (0, 10)},
+                {"interval": (2, 3)},
+                {"interval": (20, 30)},
+            ]
+        )
+        result = index.overlaps_any(
+            np.array([-2.0, 5.0, 11.0, 25.0, 31.0]),
+            np.array([-1.0, 6.0, 19.0, 26.0, 32.0]),
+        )
+        self.assertEqual(result.tolist(), [False, True, False, True, False])
+
+    def test_empty(self):
+        index = interval_scanner.IntervalIndex([])
+        self.assertEqual(index.overlapping_intervals(0, 1), [])
+        self.assertEqual(
+            index.overlaps_any(np.array([0.0]), np.array([1.0])).tolist(), [False]
+        )
@@ -45,7 +45,7 @@ class AllAnnotationsV2(pydantic.BaseModel):
 
     @classmethod
     def load(cls, v2_file: str) -> "AllAnnotationsV2":
-        with open(v2_file, "r") as f:
+        with open(v2_file, "rb") as f:
             return cls.model_validate_json(f.read())
 
     def save(self, v2_file: str):
@@ -2,7 +2,6 @@ from concurrent import futures
 import dataclasses
 import functools
 import hashlib
-import json
 import logging
 import os
 
@@ -10,6 +9,7 @@ import cv2
 import moviepy
 from numpy import typing as npt
 import numpy as np
+import orjson
 from PIL import Image
 from PIL import ImageDraw
 
@@ -403,8 +403,10 @@ class MovieCompiler:
             interval_scanner.IntervalScanner[ocr_detector.DetectionInterval] | None
         ) = None
         if blur_json_file is not None:
-            with open(blur_json_file, "r") as blur_file:
-                blur_stream: list[ocr_detector.DetectionInterval] = json.load(blur_file)
+            with open(blur_json_file, "rb") as blur_file:
+                blur_stream: list[ocr_detector.DetectionInterval] = orjson.loads(
+                    blur_file.read()
+                )
             blur_scanner = interval_scanner.IntervalScanner(blur_stream)
 
         duration = end - start
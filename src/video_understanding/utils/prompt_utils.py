@@ -1,4 +1,10 @@
+from concurrent import futures
+import functools
 import logging
+import os
+
+import numpy as np
+import orjson
 
 from .. import manual_overrides
 from .. import video_config
@@ -7,42 +13,105 @@ from ..video_flow_nodes import role_based_captioner
 from ..video_flow_nodes import video_quality_profiler
 from ..video_flow_nodes import vision_processor
 
+# Used if video_config.COMPACT_PROMPT is set.
+_COMPACT_SPEAKER_CODES = {"Teacher": "T", "Student": "S", "Either": "E"}
+_COMPACT_LEGEND = (
+    "Format: start|end|speaker|text, with times in seconds."
+    " Speakers: T=Teacher, S=Student, E=Either, V=Visual (Student's Actions)."
+)
+
+
+def _add_scene_lines(
+    lines: list[str],
+    chronology: list[vision_processor.SceneDescriptionT],
+    scene_index: int,
+    time_end: float,
+    all_remaining: bool,
+    start: float | None,
+    end: float | None,
+    compact: bool,
+) -> int:
+    """Adds the scenes after scene_index which are before time_end.
+
+    Returns the index of the last scene visited.
+    """
+    while scene_index + 1 < len(chronology) and (
+        chronology[scene_index + 1].time < time_end or all_remaining
+    ):
+        scene_index += 1
+        this_scene = chronology[scene_index]
+        if not this_scene.actions:
+            continue
+
+        if start is not None and this_scene.time < start:
+            continue
+        if end is not None and this_scene.time > end:
+            break
+
+        last_scene_time = chronology[scene_index - 1].time if scene_index > 0 else 0
+
+        if compact:
+            lines.append(
+                f"{last_scene_time:0.1f}|{this_scene.time:0.1f}|V|"
+                + " ".join(this_scene.actions)
+            )
+        else:
+            lines.append(
+                f"[{last_scene_time:0.1f} - {this_scene.time:0.1f}] _[Visual (Student's Actions): "
+                + " ".join(this_scene.actions)
+                + "]_"
+            )
+    return scene_index
+
 
 def caption_lines_for_prompt(
     source_file: str,
-    role_aware_summary: list[role_based_captioner.RoleAwareCaptionT],
+    role_aware_summary: role_based_captioner.RoleAwareCaptionsSoA,
     scene_understanding: vision_processor.SceneListT | None,
     bad_segments: list[video_quality_profiler.BadSegment] | None = None,
     start: float | None = None,
     end: float | None = None,
 ) -> list[str]:
 
-    def _caption_to_text(caption: role_based_captioner.RoleAwareCaptionT) -> str:
-        return f"[{caption['interval'][0]:.1f} - {caption['interval'][1]:.1f}] {caption['speaker']}: {caption['text']}"
-
-    lines: list[str] = []
-
-    # Empty scanner if there is no bad segments.
-    bad_segments_scanner = interval_scanner.IntervalScanner(bad_segments or [])
+    compact = video_config.COMPACT_PROMPT
+    lines: list[str] = [_COMPACT_LEGEND] if compact else []
+
+    intervals = role_aware_summary.intervals
+    if end is not None:
+        # Captions are sorted by start, so the ones after the end are cut off
+        # without visiting them.
+        intervals = intervals[: np.searchsorted(intervals[:, 0], end, side="right")]
+    caption_starts = intervals[:, 0]
+    caption_ends = intervals[:, 1]
+    # Empty index if there is no bad segments.
+    in_bad_segment = interval_scanner.IntervalIndex(bad_segments or []).overlaps_any(
+        caption_starts, caption_ends
+    )
 
     scene_index = -1
     lines_skipped: bool = False
-    for caption_idx, caption in enumerate(role_aware_summary):
-        if manual_overrides.is_clip_ineligible(
-            source_file, caption["interval"][0], caption["interval"][1]
-        ):
-            logging.info(
-                f"Skipping due to manual override - {caption['speaker']}: {caption['text']}"
-            )
+    for caption_idx, (
+        caption_start,
+        caption_end,
+        speaker,
+        text,
+        is_bad,
+    ) in enumerate(
+        zip(
+            caption_starts.tolist(),
+            caption_ends.tolist(),
+            role_aware_summary.speakers,
+            role_aware_summary.texts,
+            in_bad_segment.tolist(),
+        )
+    ):
+        if manual_overrides.is_clip_ineligible(source_file, caption_start, caption_end):
+            logging.info(f"Skipping due to manual override - {speaker}: {text}")
             lines_skipped = True
             continue
 
-        if bad_segments_scanner.overlapping_intervals(
-            caption["interval"][0], caption["interval"][1]
-        ):
-            logging.info(
-                f"Skipping due to bad segment - {caption['speaker']}: {caption['text']}"
-            )
+        if is_bad:
+            logging.info(f"Skipping due to bad segment - {speaker}: {text}")
             lines_skipped = True
             continue
 
@@ -51,40 +120,127 @@ def caption_lines_for_prompt(
             lines_skipped = False
 
         if video_config.ENABLE_VISION and scene_understanding is not None:
-            time_end = caption["interval"][1]
-            # For the last caption, iterate all remaining scenes.
-            is_last_caption = caption_idx == len(role_aware_summary) - 1
-            while scene_index + 1 < len(scene_understanding.chronology) and (
-                scene_understanding.chronology[scene_index + 1].time < time_end
-                or is_last_caption
-            ):
-                scene_index += 1
-                this_scene = scene_understanding.chronology[scene_index]
-                if not this_scene.actions:
-                    continue
-
-                if start is not None and this_scene.time < start:
-                    continue
-                if end is not None and this_scene.time > end:
-                    break
-
-                last_scene_time = (
-                    scene_understanding.chronology[scene_index - 1].time
-                    if scene_index > 0
-                    else 0
-                )
-
-                lines.append(
-                    f"[{last_scene_time:0.1f} - {this_scene.time:0.1f}] _[Visual (Student's Actions): "
-                    + " ".join(this_scene.actions)
-                    + "]_"
-                )
-
-        if start is not None and caption["interval"][1] < start:
+            scene_index = _add_scene_lines(
+                lines,
+                scene_understanding.chronology,
+                scene_index,
+                time_end=caption_end,
+                # For the last caption, add all remaining scenes.
+                all_remaining=caption_idx == len(role_aware_summary) - 1,
+                start=start,
+                end=end,
+                compact=compact,
+            )
+
+        if start is not None and caption_end < start:
             continue
-        if end is not None and caption["interval"][0] > end:
-            break
 
-        lines.append(_caption_to_text(caption))
+        if compact:
+            code = _COMPACT_SPEAKER_CODES.get(speaker, speaker)
+            lines.append(f"{caption_start:.1f}|{caption_end:.1f}|{code}|{text.strip()}")
+        else:
+            lines.append(f"[{caption_start:.1f} - {caption_end:.1f}] {speaker}: {text}")
+
+    if (
+        end is not None
+        and video_config.ENABLE_VISION
+        and scene_understanding is not None
+    ):
+        # Add the scenes between the last caption and the end.
+        num_lines = len(lines)
+        _add_scene_lines(
+            lines,
+            scene_understanding.chronology,
+            scene_index,
+            time_end=end,
+            all_remaining=True,
+            start=start,
+            end=end,
+            compact=compact,
+        )
+        if lines_skipped and len(lines) > num_lines:
+            lines.insert(num_lines, "[INADMISSIBLE SEGMENT SKIPPED]")
 
     return lines
+
+
+def _load_scene_understanding(file_name: str) -> vision_processor.SceneListT:
+    with open(file_name, "rb") as f:
+        return vision_processor.SceneListT.model_validate_json(f.read())
+
+
+def _load_bad_segments(file_name: str) -> list[video_quality_profiler.BadSegment]:
+    with open(file_name, "rb") as f:
+        return orjson.loads(f.read())
+
+
+@functools.lru_cache(maxsize=8)
+def _cached_caption_text(
+    source_file: str,
+    role_aware_summary_file: str,
+    scene_understanding_file: str | None,
+    bad_video_segments_file: str,
+    # Only used to invalidate the cache.
+    enable_vision: bool,
+    compact_prompt: bool,
+    mtimes: tuple[int, ...],
+) -> str:
+    if enable_vision and scene_understanding_file is None:
+        raise ValueError(
+            "Vision is enabled, so scene_understanding_file must be provided."
+        )
+
+    # The files are read concurrently, to overlap their I/O latency.
+    with futures.ThreadPoolExecutor(max_workers=3) as executor:
+        role_aware_summary_future = executor.submit(
+            role_based_captioner.RoleAwareCaptionsSoA.from_json,
+            role_aware_summary_file,
+        )
+        scene_understanding_future = (
+            executor.submit(_load_scene_understanding, scene_understanding_file)
+            if enable_vision and scene_understanding_file is not None
+            else None
+        )
+        bad_segments_future = executor.submit(
+            _load_bad_segments, bad_video_segments_file
+        )
+        role_aware_summary = role_aware_summary_future.result()
+        scene_understanding = (
+            scene_understanding_future.result()
+            if scene_understanding_future is not None
+            else None
+        )
+        bad_segments = bad_segments_future.result()
+
+    return "\n".join(
+        caption_lines_for_prompt(
+            source_file=source_file,
+            role_aware_summary=role_aware_summary,
+            scene_understanding=scene_understanding,
+            bad_segments=bad_segments,
+        )
+    )
+
+
+def caption_text_for_files(
+    *,
+    source_file: str,
+    role_aware_summary_file: str,
+    scene_understanding_file: str | None,
+    bad_video_segments_file: str,
+) -> str:
+    """Loads the files, and returns the joined caption_lines_for_prompt().
+
+    This is memoized, since several nodes build their prompts from the same
+    files of a video.
+    """
+    files = [role_aware_summary_file, scene_understanding_file, bad_video_segments_file]
+    return _cached_caption_text(
+        source_file,
+        role_aware_summary_file,
+        scene_understanding_file,
+        bad_video_segments_file,
+        enable_vision=video_config.ENABLE_VISION,
+        compact_prompt=video_config.COMPACT_PROMPT,
+        mtimes=tuple(os.stat(f).st_mtime_ns for f in files if f is not None),
+    )
@@ -8,6 +8,8 @@ from PIL import Image
 from pyannote import audio  # type: ignore
 import ultralytics
 
+from typing import Any
+
 _YOLO_WEIGHTS = os.path.expanduser(
     "~/code/bounding-box-model/_yolo_models/multi-class/weights/best.pt"
 )
@@ -26,22 +28,35 @@ class YoloWindowDetector:
         self._yolo = ultralytics.YOLO(_YOLO_WEIGHTS)
 
     def detect(
-        self, frame_rgb: cvt.MatLike | Image.Image, log_str: str
+        self, frame: cvt.MatLike | Image.Image, log_str: str
     ) -> dict[DetectionType, tuple[int, int, int, int]]:
         """Detects teacher/student boxes.
 
         Args:
-            frame_rgb: Note that if PIL.Image is passed, it automatically converts to RGB.
-                But if passed as MatLike, conversion must be performed before passing.
+            frame: If MatLike, it must be in BGR order, as the model treats arrays
+                as BGR. A PIL.Image is converted by the model itself, so pass it as is.
 
         Returns:
             All detected windows in xyxy form.
         """
+        return self.detect_batch([frame], [log_str])[0]
+
+    def detect_batch(
+        self, frames: list[cvt.MatLike | Image.Image], log_strs: list[str]
+    ) -> list[dict[DetectionType, tuple[int, int, int, int]]]:
+        """Same as detect(), but runs the model once on multiple frames."""
+        results = self._yolo(frames, verbose=False)
+        assert len(results) == len(frames)
+        return [
+            self._parse_result(result, log_str)
+            for result, log_str in zip(results, log_strs)
+        ]
+
+    def _parse_result(
+        self, result: Any, log_str: str
+    ) -> dict[DetectionType, tuple[int, int, int, int]]:
         detections: dict[DetectionType, tuple[int, int, int, int]] = {}
 
-        results = self._yolo([frame_rgb], verbose=False)
-        assert len(results) == 1  # Single image should result in single result.
-        result = results[0]
         cls_id_counts = collections.Counter(int(x) for x in result.boxes.cls)
         for cls, box in zip(result.boxes.cls, result.boxes.xyxy):
             id = int(cls)
@@ -47,6 +47,13 @@ VIDEO_SUMMARIES_DIR = RESULTS_DIR / "video_summaries"
 # To use new labels, freeze and set the path.
 MANUAL_LABELS_DIR = _HOME / "data/manual_labeling/frozen/latest"
 
+# LLM responses of the flow are cached here, so that re-runs with the same
+# prompts do not query again. Bump VERSION to query afresh.
+LLM_CACHE_DIR = _HOME / ".cache/video-summarizer/llm" / VERSION
+
+# Audio extracted from the sources is cached here, to be shared across nodes.
+WAV_CACHE_DIR = _HOME / ".cache/video-summarizer/wav"
+
 # Used to keep temporary movies and such.
 # Read with the tempdir() function here, which also creates it.
 _TEMP_DIR = _HOME / "data/_tmp"
@@ -58,6 +65,10 @@ TESTING_MODE = False
 # Development flag, set via video_flow.py.
 ENABLE_VISION = True
 
+# Development flag to A/B a compact caption format in prompts, which uses fewer
+# input tokens.
+COMPACT_PROMPT = False
+
 
 def tempdir() -> pathlib.Path:
     os.makedirs(_TEMP_DIR, exist_ok=True)
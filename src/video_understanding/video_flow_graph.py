@@ -1,8 +1,12 @@
+from concurrent import futures
 import functools
 import hashlib
 import json
 import logging
 import os
+import tempfile
+
+import orjson
 
 from . import prompt_templates
 from . import video_config
@@ -23,13 +27,57 @@ from .video_flow_nodes import video_quality_profiler
 from .video_flow_nodes import vision_processor
 from .video_flow_nodes import voice_separator
 
+# Independent nodes for a video are run concurrently, up to this many at a time.
+_MAX_CONCURRENT_NODES = 4
+
+# Nodes using the GPU are put in this concurrency group, so that they run one at a time.
+_GPU = "gpu"
+
+
+# Remembers checksums of each video, keyed by the file's stat.
+_CHECKSUMS_FNAME = "checksums.json"
+
 
 def _file_checksum(source_file: str) -> str:
-    hasher = hashlib.sha1()
-    with open(source_file, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            hasher.update(byte_block)
-    return hasher.hexdigest()
+    # Note: The checksum names the results directory, so the algorithm must stay
+    # sha1 to keep finding previously computed results.
+    # Unbuffered, so that file_digest() reads straight into its own buffer.
+    with open(source_file, "rb", buffering=0) as f:
+        return hashlib.file_digest(f, "sha1").hexdigest()
+
+
+def _video_dir(video_path: str) -> str:
+    """Directory containing results of all versions of the video."""
+    video_name_wo_ext = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(video_config.WORKSPACE_DIR, video_name_wo_ext)
+
+
+def _cached_file_checksum(video_path: str) -> str:
+    """Same as _file_checksum(), but skips reading the file if it is unchanged."""
+    stat = os.stat(video_path)
+    stat_key = f"{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    checksums_file = os.path.join(_video_dir(video_path), _CHECKSUMS_FNAME)
+    try:
+        with open(checksums_file) as f:
+            checksums: dict[str, str] = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        checksums = {}
+    if stat_key in checksums:
+        return checksums[stat_key]
+
+    checksum = _file_checksum(video_path)
+    checksums[stat_key] = checksum
+    os.makedirs(os.path.dirname(checksums_file), exist_ok=True)
+    # Write and rename, since this may run in the background while the file is
+    # being read.
+    temp_fd, temp_file = tempfile.mkstemp(
+        dir=os.path.dirname(checksums_file), suffix=".tmp"
+    )
+    with os.fdopen(temp_fd, "w") as f:
+        json.dump(checksums, f, indent=2)
+    os.replace(temp_file, checksums_file)
+    return checksum
 
 
 class VideoFlowGraph:
@@ -54,7 +102,7 @@ class VideoFlowGraph:
                 "source_file": self._source_file_const,
                 "out_file_stem": self._out_stem_const,
             },
-            version=2,
+            version=3,
         )
         custom_yolo_detect_node = graph.add_node(
             18,
@@ -63,7 +111,8 @@ class VideoFlowGraph:
                 "source_file": self._source_file_const,
                 "out_file_stem": self._out_stem_const,
             },
-            version=0,
+            version=custom_yolo_detector.CustomYoloDetector.source_hash(),
+            concurrency_group=_GPU,
         )
         del custom_yolo_detect_node  # Incomplete and likely to get dropped.
         transcribe_node = graph.add_node(
@@ -74,6 +123,7 @@ class VideoFlowGraph:
                 "out_file_stem": self._out_stem_const,
             },
             invalidate_before=1753438637,
+            concurrency_group=_GPU,
         )
         diarize_node = graph.add_node(
             7,
@@ -83,6 +133,7 @@ class VideoFlowGraph:
                 "out_file_stem": self._out_stem_const,
             },
             version=2,
+            concurrency_group=_GPU,
         )
         transcription_refine_node = graph.add_node(
             14,
@@ -145,6 +196,7 @@ class VideoFlowGraph:
                 "out_file_stem": self._out_stem_const,
             },
             version=7,
+            concurrency_group=_GPU,
         )
         if not video_config.ENABLE_VISION:
             self._vision_process_node = None
@@ -227,7 +279,8 @@ class VideoFlowGraph:
                 "source_file": self._source_file_const,
                 "out_file_stem": self._out_stem_const,
             },
-            version=2,
+            version=3,
+            concurrency_group=_GPU,
         )
 
         # Common nodes for all programs.
@@ -256,26 +309,47 @@ class VideoFlowGraph:
             role_identify_node,
         ]
 
-    def persist_graph_for(self, video_path: str):
-        video_name_wo_ext = os.path.splitext(os.path.basename(video_path))[0]
+        # Checksums are needed every time a video is visited during a batch.
+        # They are computed once, and may be computed ahead in the background.
+        self._checksums: dict[str, futures.Future[str]] = {}
+        # Results directory of each video, created on first use.
+        self._results_dirs: dict[str, str] = {}
 
-        # Store each version in its dir as checksum.
-        results_dir = os.path.join(
-            video_config.WORKSPACE_DIR, video_name_wo_ext, _file_checksum(video_path)
-        )
+    def _checksum(self, video_path: str) -> str:
+        if video_path not in self._checksums or self._checksums[video_path].cancelled():
+            future: futures.Future[str] = futures.Future()
+            future.set_result(_cached_file_checksum(video_path))
+            self._checksums[video_path] = future
+        return self._checksums[video_path].result()
 
-        os.makedirs(results_dir, exist_ok=True)
+    def _results_dir(self, video_path: str) -> str:
+        if video_path not in self._results_dirs:
+            # Store each version in its dir as checksum.
+            results_dir = os.path.join(
+                _video_dir(video_path), self._checksum(video_path)
+            )
+            os.makedirs(results_dir, exist_ok=True)
+            self._results_dirs[video_path] = results_dir
+        return self._results_dirs[video_path]
 
+    def _graph_paths(self, video_path: str) -> tuple[str, str]:
+        """Returns the persist path and the output stem for a video."""
+        results_dir = self._results_dir(video_path)
         persist_path = os.path.join(results_dir, "graph_state.json")
-
-        self.graph.persist(persist_path)
-
         # Stuff will be appended to the stem, like `out_stem + ".transcription.json"`.
         out_stem = os.path.join(results_dir, "video_flow_data")
+        return persist_path, out_stem
 
-        # Set the constants.
-        self._source_file_const.set_value(video_path)
-        self._out_stem_const.set_value(out_stem)
+    def persist_graph_for(self, video_path: str):
+        # Note: In a batch, this is called for every video before each node.
+        persist_path, out_stem = self._graph_paths(video_path)
+        self.graph.persist(
+            persist_path,
+            constants={
+                self._source_file_const.id: video_path,
+                self._out_stem_const.id: out_stem,
+            },
+        )
 
     def run(self, *, all_files_to_process: list[str]):
 
@@ -286,15 +360,29 @@ class VideoFlowGraph:
             )
             self.persist_graph_for(video_path)
 
-        self.graph.process_batch(
-            batch_items=all_files_to_process,
-            run_nodes=self._final_nodes,
-            prep_fn=functools.partial(prep_fn, count=len(all_files_to_process)),
-            post_fn=lambda file_no, path: video_config.repeated_warnings(),
-            release_resources_after=self._release_resources_after,
-            # As there is little to no errors, we want to fail immediately.
-            fault_tolerant=False,
-        )
+        # Read and checksum the upcoming videos in the background, while the
+        # graph is processing the earlier ones.
+        checksum_executor = futures.ThreadPoolExecutor(max_workers=1)
+        for video_path in all_files_to_process:
+            if video_path not in self._checksums:
+                self._checksums[video_path] = checksum_executor.submit(
+                    _cached_file_checksum, video_path
+                )
+
+        try:
+            self.graph.process_batch(
+                batch_items=all_files_to_process,
+                run_nodes=self._final_nodes,
+                prep_fn=functools.partial(prep_fn, count=len(all_files_to_process)),
+                post_fn=lambda file_no, path: video_config.repeated_warnings(),
+                release_resources_after=self._release_resources_after,
+                # As there is little to no errors, we want to fail immediately.
+                fault_tolerant=False,
+                max_workers=_MAX_CONCURRENT_NODES,
+            )
+        finally:
+            # Do not wait to read remaining files if processing failed.
+            checksum_executor.shutdown(cancel_futures=True)
 
         video_config.repeated_warnings()
 
@@ -302,8 +390,8 @@ class VideoFlowGraph:
         result = self.role_based_caption_node.result
         if result is None:
             raise ValueError("Role aware captions not computed")
-        with open(result) as f:
-            return json.load(f)
+        with open(result, "rb") as f:
+            return orjson.loads(f.read())
 
     def scene_understanding_result(self) -> vision_processor.SceneListT | None:
         if self._vision_process_node is None:
@@ -312,5 +400,6 @@ class VideoFlowGraph:
         result = self._vision_process_node.result
         if result is None:
             raise ValueError("Scene understanding not computed")
-        with open(result) as f:
+        # Bytes are parsed directly, without decoding to str first.
+        with open(result, "rb") as f:
             return vision_processor.SceneListT.model_validate_json(f.read())
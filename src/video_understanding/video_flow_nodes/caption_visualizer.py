@@ -1,6 +1,5 @@
 import dataclasses
 import enum
-import json
 import logging
 import os
 import random
@@ -8,6 +7,7 @@ import random
 import cv2
 import moviepy  # type: ignore
 import numpy as np
+import orjson
 
 from . import speaker_assigner
 from ...flow import process_node
@@ -294,10 +294,10 @@ class CaptionVisualizer(process_node.ProcessNode):
         out_file_stem: str,
     ) -> str:
         out_file = out_file_stem + ".visualization.mp4"
-        with open(word_captions_file) as f:
-            captions: list[speaker_assigner.SpeakerCaptionT] = json.load(f)
-        with open(diarization_file) as f:
-            diarization = json.load(f)
+        with open(word_captions_file, "rb") as f:
+            captions: list[speaker_assigner.SpeakerCaptionT] = orjson.loads(f.read())
+        with open(diarization_file, "rb") as f:
+            diarization = orjson.loads(f.read())
         visualizer = _Visualizer(captions, diarization, identified_roles)
 
         video = moviepy.VideoFileClip(source_file)
@@ -3,19 +3,23 @@
 # If we do this -
 # We will need to add code complexity to store, load, and scan the detections.
 # The complexity can be avoided since detection on image is very cheap.
+from concurrent import futures
 import logging
+import queue
+import threading
+import time
 
 import cv2
 import moviepy
 import numpy as np
 import numpy.typing as npt
+import orjson
 from pyannote import audio  # type: ignore
-import pydantic
 
 from ...flow import process_node
 from ..utils import yolo_window_detector
 
-from typing import override
+from typing import override, TypedDict
 
 # Number of pixels within which we merge with the last detection.
 _MERGE_THRESHOLD_PX = 5
@@ -23,19 +27,121 @@ _MERGE_THRESHOLD_PX = 5
 # Number of seconds of absent images to be merged / filled in.
 _MERGE_THRESHOLD_S = 1.0
 
+# Number of frames to run through YOLO at a time.
+_BATCH_SIZE = 16
 
-class _YoloDetection(pydantic.BaseModel):
+# Maximum number of batches waiting between pipeline stages.
+_QUEUE_SIZE = 8
+
+# Initial number of detections allocated per class.
+_INITIAL_CAPACITY = 64
+
+# Frames per second to sample for detection, when inference keeps up.
+_SAMPLE_FPS = 5.0
+
+# Per-frame inference latency beyond which we sample fewer frames.
+_TARGET_FRAME_LATENCY_S = 0.05
+
+# Weight of the newest measurement in the latency moving average.
+_LATENCY_EWMA_ALPHA = 0.2
+
+
+# This is the format of each detection in the saved json.
+class _YoloDetection(TypedDict):
     # Includes both ends.
     frame_range: tuple[int, int]
     interval: tuple[float, float]
     xyxy: tuple[float, float, float, float]
 
 
+class _ClsBuffer:
+    """Detections of a single class.
+
+    Only the last detection can still be merged into. It is kept in plain
+    python attributes, so that merging does not index into arrays. Earlier
+    detections are stored column-wise in growing arrays.
+    """
+
+    __slots__ = (
+        "n",
+        "frames",
+        "times",
+        "xyxy",
+        "has_last",
+        "start_frame",
+        "end_frame",
+        "start_time",
+        "end_time",
+        "x0",
+        "y0",
+        "x1",
+        "y1",
+        "samples",
+    )
+
+    def __init__(self) -> None:
+        # Number of earlier detections stored. Rows after this are unused.
+        self.n = 0
+        self.frames = np.empty((_INITIAL_CAPACITY, 2), dtype=np.int32)
+        self.times = np.empty((_INITIAL_CAPACITY, 2), dtype=np.float64)
+        self.xyxy = np.empty((_INITIAL_CAPACITY, 4), dtype=np.float64)
+        # The last detection.
+        self.has_last = False
+        self.start_frame = self.end_frame = 0
+        self.start_time = self.end_time = 0.0
+        self.x0 = self.y0 = self.x1 = self.y1 = 0.0
+        # Number of sampled frames merged into the last detection.
+        self.samples = 0
+
+    def _store_last(self) -> None:
+        if self.n == len(self.frames):
+            # Double the capacity, so that appends are amortized O(1).
+            self.frames = np.concatenate([self.frames, np.empty_like(self.frames)])
+            self.times = np.concatenate([self.times, np.empty_like(self.times)])
+            self.xyxy = np.concatenate([self.xyxy, np.empty_like(self.xyxy)])
+        self.frames[self.n] = (self.start_frame, self.end_frame)
+        self.times[self.n] = (self.start_time, self.end_time)
+        self.xyxy[self.n] = (self.x0, self.y0, self.x1, self.y1)
+        self.n += 1
+
+    def append(
+        self, frame: int, time: float, xyxy: tuple[float, float, float, float]
+    ) -> None:
+        if self.has_last:
+            self._store_last()
+        self.has_last = True
+        self.start_frame = self.end_frame = frame
+        self.start_time = self.end_time = time
+        x0, y0, x1, y1 = xyxy
+        # Detector gives ints, but saved coordinates are always float.
+        self.x0, self.y0, self.x1, self.y1 = float(x0), float(y0), float(x1), float(y1)
+        self.samples = 1
+
+    def detections(self) -> list[_YoloDetection]:
+        # Note: tolist() converts to python int and float in one go.
+        result: list[_YoloDetection] = [
+            {"frame_range": frames, "interval": times, "xyxy": xyxy}
+            for frames, times, xyxy in zip(
+                self.frames[: self.n].tolist(),
+                self.times[: self.n].tolist(),
+                self.xyxy[: self.n].tolist(),
+            )
+        ]
+        if self.has_last:
+            result.append(
+                {
+                    "frame_range": (self.start_frame, self.end_frame),
+                    "interval": (self.start_time, self.end_time),
+                    "xyxy": (self.x0, self.y0, self.x1, self.y1),
+                }
+            )
+        return result
+
+
 class YoloDetections:
     def __init__(self) -> None:
         self._last_frame = -1
-        self._by_cls: dict[str, list[_YoloDetection]] = {}
-        self._pydantic_root = pydantic.RootModel[dict[str, list[_YoloDetection]]]
+        self._by_cls: dict[str, _ClsBuffer] = {}
 
     def add(
         self,
@@ -44,40 +150,75 @@ class YoloDetections:
         time: float,
         xyxy: tuple[float, float, float, float],
     ):
-        dets = self._by_cls.setdefault(cls_name, [])
-
-        merge = False
-        if dets:
-            last_det = dets[-1]
-            if time - last_det.interval[1] <= _MERGE_THRESHOLD_S:
-                # Check if coordinates are almost same.
-                max_diff = max(abs(a - b) for a, b in zip(xyxy, last_det.xyxy))
-                if max_diff < _MERGE_THRESHOLD_PX:
-                    merge = True
-
-            if merge:
-                last_det.frame_range = (last_det.frame_range[0], frame)
-                last_det.interval = (
-                    last_det.interval[0],
-                    time,
-                )
-                # Compute weighted average of the xyxy, by number of frames.
-                last_frames = last_det.frame_range[1] - last_det.frame_range[0] + 1
-                new_xyxy = tuple(
-                    (last * last_frames + current) / (last_frames + 1)
-                    for last, current in zip(last_det.xyxy, xyxy)
-                )
-                assert len(new_xyxy) == 4
-                last_det.xyxy = new_xyxy
-
-        if not merge:
-            this_det = _YoloDetection(
-                frame_range=(frame, frame), interval=(time, time), xyxy=xyxy
+        buf = self._by_cls.get(cls_name)
+        if buf is None:
+            buf = self._by_cls[cls_name] = _ClsBuffer()
+
+        if buf.has_last and time - buf.end_time <= _MERGE_THRESHOLD_S:
+            x0, y0, x1, y1 = xyxy
+            # Check if coordinates are almost same.
+            max_diff = max(
+                abs(buf.x0 - x0), abs(buf.y0 - y0), abs(buf.x1 - x1), abs(buf.y1 - y1)
             )
-            dets.append(this_det)
+            if max_diff < _MERGE_THRESHOLD_PX:
+                # Compute weighted average of the xyxy, by number of samples.
+                # Frames are not all sampled, so the frame range cannot be used.
+                samples = buf.samples
+                n1 = samples + 1
+                buf.samples = n1
+                buf.end_frame = frame
+                buf.end_time = time
+                buf.x0 = (buf.x0 * samples + x0) / n1
+                buf.y0 = (buf.y0 * samples + y0) / n1
+                buf.x1 = (buf.x1 * samples + x1) / n1
+                buf.y1 = (buf.y1 * samples + y1) / n1
+                return
+
+        buf.append(frame, time, xyxy)
 
     def model_dump_json(self) -> str:
-        return self._pydantic_root.model_validate(self._by_cls).model_dump_json()
+        return orjson.dumps(
+            {cls_name: buf.detections() for cls_name, buf in self._by_cls.items()}
+        ).decode()
+
+
+# A decoded frame, as (frame_count, frame_time, frame).
+_Frame = tuple[int, float, npt.NDArray[np.uint8]]
+
+# Detections on a frame, as (frame_count, frame_time, detections).
+_FrameDetections = tuple[
+    int,
+    float,
+    dict[yolo_window_detector.DetectionType, tuple[int, int, int, int]],
+]
+
+
+class _AdaptiveStride:
+    """Decides every how many frames to run detection.
+
+    Starts by sampling at _SAMPLE_FPS. If the inference latency goes above
+    target the stride is doubled, and it is halved again once latency drops.
+    """
+
+    def __init__(self, fps: float) -> None:
+        self._min_stride = max(1, int(fps / _SAMPLE_FPS))
+        # Keep the gap between samples within the merge threshold, so that
+        # continuous detections still merge into one.
+        self._max_stride = max(self._min_stride, int(fps * _MERGE_THRESHOLD_S))
+        self.stride = self._min_stride
+        self._latency_ewma: float | None = None
+
+    def update(self, frame_latency_s: float) -> None:
+        if self._latency_ewma is None:
+            self._latency_ewma = frame_latency_s
+        else:
+            self._latency_ewma += _LATENCY_EWMA_ALPHA * (
+                frame_latency_s - self._latency_ewma
+            )
+        if self._latency_ewma > _TARGET_FRAME_LATENCY_S:
+            self.stride = min(self.stride * 2, self._max_stride)
+        elif self._latency_ewma < _TARGET_FRAME_LATENCY_S / 2:
+            self.stride = max(self.stride // 2, self._min_stride)
 
 
 class CustomYoloDetector(process_node.ProcessNode):
@@ -93,31 +234,110 @@ class CustomYoloDetector(process_node.ProcessNode):
         clip = moviepy.VideoFileClip(source_file)
 
         detections = YoloDetections()
+        stride = _AdaptiveStride(clip.fps)
 
-        frame_time: np.float64
-        frame: npt.NDArray[np.uint8]
-        for frame_count, (frame_time, frame) in enumerate(
-            clip.iter_frames(with_times=True)
-        ):
-            result = self._detector.detect(
-                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), f"{frame_count=} {frame_time=}"
-            )
+        # Decoding, inference and merging run as a pipeline, so that decoding
+        # (ffmpeg) and inference (GPU) overlap. Both release the GIL.
+        # Set to make the stages upstream of a failure stop early.
+        stop = threading.Event()
+        # Batches of frames waiting for inference. None marks the end.
+        decoded: queue.Queue[list[_Frame] | None] = queue.Queue(_QUEUE_SIZE)
+        # Batches of detections waiting to be merged. None marks the end.
+        detected: queue.Queue[list[_FrameDetections] | None] = queue.Queue(_QUEUE_SIZE)
+
+        def decode() -> bool:
+            """Returns True if decoding was cut short by the forced break."""
+            batch: list[_Frame] = []
+            try:
+                frame_time: np.float64
+                frame: npt.NDArray[np.uint8]
+                for frame_count, (frame_time, frame) in enumerate(
+                    clip.iter_frames(with_times=True)
+                ):
+                    if stop.is_set():
+                        return False
+                    if frame_count % stride.stride == 0:
+                        # The detector takes arrays as BGR, but moviepy yields RGB.
+                        batch.append(
+                            (
+                                frame_count,
+                                float(frame_time),
+                                cv2.cvtColor(frame, cv2.COLOR_RGB2BGR),
+                            )
+                        )
+                        if len(batch) == _BATCH_SIZE:
+                            decoded.put(batch)
+                            batch = []
+
+                    if frame_count % 100 == 0:
+                        logging.info(f"frame: {frame_count}")
+
+                    if frame_count >= 300:
+                        decoded.put(batch)
+                        return True
+
+                decoded.put(batch)
+                return False
+            finally:
+                decoded.put(None)
+
+        def infer() -> None:
+            try:
+                while (batch := decoded.get()) is not None:
+                    if not batch or stop.is_set():
+                        continue
+                    start = time.monotonic()
+                    results = self._detector.detect_batch(
+                        [frame for _, _, frame in batch],
+                        [
+                            f"{frame_count=} {frame_time=}"
+                            for frame_count, frame_time, _ in batch
+                        ],
+                    )
+                    stride.update((time.monotonic() - start) / len(batch))
+                    detected.put(
+                        [
+                            (frame_count, frame_time, result)
+                            for (frame_count, frame_time, _), result in zip(
+                                batch, results
+                            )
+                        ]
+                    )
+            except BaseException:
+                stop.set()
+                # Unblock the decoder.
+                while decoded.get() is not None:
+                    pass
+                raise
+            finally:
+                detected.put(None)
+
+        with futures.ThreadPoolExecutor(max_workers=2) as executor:
+            decode_future = executor.submit(decode)
+            infer_future = executor.submit(infer)
+            try:
+                while (frame_detections := detected.get()) is not None:
+                    for frame_count, frame_time, result in frame_detections:
+                        for cls_enum, xyxy in result.items():
+                            detections.add(
+                                cls_name=cls_enum.value,
+                                frame=frame_count,
+                                time=frame_time,
+                                xyxy=xyxy,
+                            )
+            except BaseException:
+                stop.set()
+                # Unblock the inference thread.
+                while detected.get() is not None:
+                    pass
+                raise
+            forced_break = decode_future.result()
+            infer_future.result()
 
-            for cls_enum, xyxy in result.items():
-                detections.add(
-                    cls_name=cls_enum.value,
-                    frame=frame_count,
-                    time=float(frame_time),
-                    xyxy=xyxy,
-                )
-
-            if frame_count % 100 == 0:
-                logging.info(f"frame: {frame_count}")
-
-            if frame_count >= 300:
-                print(detections.model_dump_json())
-                print(f"{out_file_stem=}")
-                raise RuntimeError("forced break")
+        if forced_break:
+            print(detections.model_dump_json())
+            print(f"{out_file_stem=}")
+            raise RuntimeError("forced break")
 
         out_file = out_file_stem + ".yolo_windows.json"
         with open(out_file, "w") as f:
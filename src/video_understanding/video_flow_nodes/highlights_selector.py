@@ -1,29 +1,67 @@
 import datetime
-import json
+import operator
+
+import orjson
 
-from . import role_based_captioner
 from . import video_flow_types
-from . import video_quality_profiler
-from . import vision_processor
 from .. import prompt_templates
 from .. import video_config
 from ...flow import process_node
 from ..llm_service import llm
 from ..llm_service import llm_utils
 from ..utils import file_conventions
+from ..utils import misc_utils
 from ..utils import prompt_utils
 from ..utils import templater
 
-from typing import override
+from typing import Any, override
+
+# Highlights of these types do not have "example_of".
+_NO_EXAMPLE_OF_TYPES = {
+    video_flow_types.CompilationType.STUDENT_RESUME,
+    video_flow_types.CompilationType.FTP_HIGHLIGHTS,
+}
+
+
+def _highlights_schema(
+    compilation_type: video_flow_types.CompilationType,
+) -> dict[str, Any]:
+    """JSON schema for the LLM response, matching HighlightsT.
+
+    OpenAI needs an object at the top level, so the list is wrapped in it.
+    """
+    properties: dict[str, Any] = {}
+    if compilation_type not in _NO_EXAMPLE_OF_TYPES:
+        properties["example_of"] = {"type": "string", "enum": ["strength", "weakness"]}
+    properties |= {
+        "explanation": {"type": "string"},
+        "comment": {"type": "string"},
+        "start": {"type": "number"},
+        "end": {"type": "number"},
+        "importance": {"type": "integer"},
+    }
+    return {
+        "type": "object",
+        "properties": {
+            "highlights": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": list(properties),
+                    "additionalProperties": False,
+                },
+            }
+        },
+        "required": ["highlights"],
+        "additionalProperties": False,
+    }
 
 
 def _student_evaluation_prompt(
     compilation_type: video_flow_types.CompilationType,
-    source_file: str,
     task_description: str,
-    role_aware_summary: list[role_based_captioner.RoleAwareCaptionT],
-    scene_understanding: vision_processor.SceneListT | None,
-    bad_segments: list[video_quality_profiler.BadSegment],
+    caption_lines: str,
 ) -> list[str]:
     """Stores student evaluations as a json file and returns the path."""
     match compilation_type:
@@ -42,14 +80,7 @@ def _student_evaluation_prompt(
         prompt_template,
         {
             "task_description": task_description,
-            "caption_lines": "\n".join(
-                prompt_utils.caption_lines_for_prompt(
-                    source_file=source_file,
-                    role_aware_summary=role_aware_summary,
-                    scene_understanding=scene_understanding,
-                    bad_segments=bad_segments,
-                )
-            ),
+            "caption_lines": caption_lines,
         },
     )
 
@@ -60,6 +91,8 @@ class HighlightsSelector(process_node.ProcessNode):
         # self._llm_instance = llm.OpenAiLlmInstance("gpt-3.5-turbo")
         # self._llm_instance = llm.OpenAiLlmInstance("gpt-4.1")
         self._llm_instance = llm.OpenAiLlmInstance("o4-mini")
+        # Converts the response to JSON, so that o4-mini can reason freely.
+        self._json_formatter = llm.OpenAiLlmInstance("gpt-4.1-mini")
 
     @override
     def process(
@@ -87,34 +120,23 @@ class HighlightsSelector(process_node.ProcessNode):
         """
         out_file_suffix = f".highlights_for_{compilation_type.value}.json"
         out_file_name = out_file_stem + out_file_suffix
-        with open(role_aware_summary_file, "r") as f:
-            role_aware_summary: list[role_based_captioner.RoleAwareCaptionT] = (
-                json.load(f)
-            )
 
         task_description = file_conventions.filename_to_task(source_file)
 
-        scene_understanding: vision_processor.SceneListT | None = None
-        if video_config.ENABLE_VISION:
-            if scene_understanding_file is None:
-                raise ValueError(
-                    "Vision is enabled, so scene_understanding_file must be provided."
-                )
-            with open(scene_understanding_file, "r") as f:
-                scene_understanding = vision_processor.SceneListT.model_validate_json(
-                    f.read()
-                )
-
-        with open(bad_video_segments_file, "r") as f:
-            bad_segments: list[video_quality_profiler.BadSegment] = json.load(f)
+        # Note: This is shared across the compilation types of a video.
+        # The templates also start with it, so that OpenAI's prompt caching can
+        # reuse it across the compilation types.
+        caption_lines = prompt_utils.caption_text_for_files(
+            source_file=source_file,
+            role_aware_summary_file=role_aware_summary_file,
+            scene_understanding_file=scene_understanding_file,
+            bad_video_segments_file=bad_video_segments_file,
+        )
 
         prompt = _student_evaluation_prompt(
             compilation_type=compilation_type,
-            source_file=source_file,
             task_description=task_description,
-            role_aware_summary=role_aware_summary,
-            scene_understanding=scene_understanding,
-            bad_segments=bad_segments,
+            caption_lines=caption_lines,
         )
 
         # Current date-time as "yyyymmdd-hhmmss".
@@ -122,16 +144,21 @@ class HighlightsSelector(process_node.ProcessNode):
 
         response_list = self._llm_instance.do_prompt_and_parse(
             "\n".join(prompt),
-            transformers=[llm_utils.remove_thinking, llm_utils.parse_as_json],
+            transformers=[
+                llm_utils.remove_thinking,
+                llm_utils.parse_as_json,
+                operator.itemgetter("highlights"),
+            ],
             max_tokens=4096,
+            json_schema=_highlights_schema(compilation_type),
+            json_formatter=self._json_formatter,
+            cache_dir=video_config.LLM_CACHE_DIR,
+            prompt_cache_key=misc_utils.fingerprint(caption_lines),
             log_file=f"{out_file_name}.llm_log.v{video_config.VERSION}.{datetime_str}.txt",
         )
 
         for response in response_list:
-            if compilation_type in {
-                video_flow_types.CompilationType.STUDENT_RESUME,
-                video_flow_types.CompilationType.FTP_HIGHLIGHTS,
-            }:
+            if compilation_type in _NO_EXAMPLE_OF_TYPES:
                 # Check that "example_of" is not populated.
                 if "example_of" in response:
                     raise ValueError(f"{compilation_type=} but has 'example_of'.")
@@ -148,6 +175,6 @@ class HighlightsSelector(process_node.ProcessNode):
             # TODO: This should ideally be moved to a prompt transformer, so that automatic retry can happen.
             video_flow_types.HighlightsT(**response)
 
-        with open(out_file_name, "w") as f:
-            json.dump(response_list, f)
+        with open(out_file_name, "wb") as f:
+            f.write(orjson.dumps(response_list))
         return out_file_name
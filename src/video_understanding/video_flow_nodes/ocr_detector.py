@@ -1,14 +1,12 @@
-import json
 import logging
 
-import moviepy  # type: ignore
-from numpy import typing as npt
-import numpy as np
+import orjson
 
 from ...flow import process_node
 from ..detectors import detection_utils
 from ..detectors import easyocr_custom
 from ..detectors import tesseract_custom
+from ..utils import frame_reader
 
 from typing import override, TypedDict
 
@@ -16,10 +14,10 @@ from typing import override, TypedDict
 # EasyOCR seems more accurate.
 _EASYOCR = True
 
-# How long to skip ahead if detected. We can afford to skip more, since we can still blur if the number goes off and comes back.
-_DETECTED_SCAN_INTERVAL = 1.0
-# How long to skip ahead if undetected.
-_UNDETECTED_SCAN_INTERVAL = 0.5
+# Interval of the initial scan, which is then refined where detections change.
+_SCAN_INTERVAL = 0.5
+# Number of frames of the initial scan to run through OCR together.
+_SCAN_BATCH_SIZE = 16
 # Note that we will blur around the detected interval a bit, which should nicely cover things up.
 _REFINE_INTERVAL = 1 / 30.0
 
@@ -41,60 +39,80 @@ class OcrDetector(process_node.ProcessNode):
             self._easyocr = easyocr_custom.Detector()
 
     def _detect(
-        self, clip: moviepy.VideoFileClip, t: float
+        self, clip: frame_reader.FrameReader, t: float
     ) -> list[detection_utils.DetectionResult]:
-        frame: npt.NDArray[np.uint8] = clip.get_frame(t)  # type: ignore
+        frame = clip.get_frame(t)
         if self._easyocr is not None:
             return list(self._easyocr.phone_numbers(frame))
         else:
             return list(tesseract_custom.iterate_phone_numbers(frame))
 
+    def _detect_batch(
+        self, clip: frame_reader.FrameReader, times: list[float]
+    ) -> list[list[detection_utils.DetectionResult]]:
+        frames = [clip.get_frame(t) for t in times]
+        if self._easyocr is not None:
+            return self._easyocr.phone_numbers_batch(frames)
+        else:
+            return [list(tesseract_custom.iterate_phone_numbers(f)) for f in frames]
+
     def _detect_time_series(
         self,
-        clip: moviepy.VideoFileClip,
+        clip: frame_reader.FrameReader,
     ) -> list[_TimedDetectionT]:
-        timed_detections: list[_TimedDetectionT] = []
+        # Note: The scan is on a fixed grid, so that frames can be batched.
+        times: list[float] = []
         t = 0.0
-        assert isinstance(clip.duration, float)
         while t < clip.duration:
-            timed_detections.append((t, self._detect(clip, t)))
+            times.append(t)
+            t += _SCAN_INTERVAL
+
+        timed_detections: list[_TimedDetectionT] = []
+        for start in range(0, len(times), _SCAN_BATCH_SIZE):
+            batch_times = times[start : start + _SCAN_BATCH_SIZE]
+            timed_detections.extend(
+                zip(batch_times, self._detect_batch(clip, batch_times))
+            )
 
             logging.info(
-                f"OCR progress: t = {t} / {clip.duration} - detections so far: {sum(len(x[1]) for x in timed_detections)}"
+                f"OCR progress: t = {batch_times[-1]} / {clip.duration} - detections so far: {sum(len(x[1]) for x in timed_detections)}"
             )
-            if timed_detections[-1][1]:
-                t += _DETECTED_SCAN_INTERVAL
-            else:
-                t += _UNDETECTED_SCAN_INTERVAL
 
         return timed_detections
 
     def _iterative_refine(
-        self, clip: moviepy.VideoFileClip, timed_detections: list[_TimedDetectionT]
-    ) -> None:
-        # Scans through the detection list. Whenever two consecutive detections
-        # are apart by _SCAN_TIME_SMALL at index i and i+1, inserts the middle,
-        # starts the process again at ith index.
-        i = 0
-        while i < len(timed_detections) - 1:
-            t1, detections1 = timed_detections[i]
-            t2, detections2 = timed_detections[i + 1]
-            if (
-                t2 - t1 > _REFINE_INTERVAL
-                and not detection_utils.result_list_almost_equal(
-                    detections1, detections2
-                )
-            ):
-                logging.info(f"Not equal: {(t1, detections1)}")
-                logging.info(f"      And: {(t2, detections2)}")
-                mid_time = (t1 + t2) / 2
-                logging.info(f"Iterative refinement at {mid_time}")
-
-                mid_detections = self._detect(clip, mid_time)
-                timed_detections.insert(i + 1, (mid_time, mid_detections))
-                # Continue at i to check for the newly inserted detection.
-                continue
-            i += 1
+        self, clip: frame_reader.FrameReader, timed_detections: list[_TimedDetectionT]
+    ) -> list[_TimedDetectionT]:
+        """Returns the detections, with more inserted where they change.
+
+        Whenever two consecutive detections differ and are more than
+        _REFINE_INTERVAL apart, the middle is detected, and both halves are
+        refined further.
+        """
+        if not timed_detections:
+            return []
+        refined = [timed_detections[0]]
+        for next_detection in timed_detections[1:]:
+            # Points yet to be appended, between the last refined and next one.
+            # The last element is the closest.
+            pending = [next_detection]
+            while pending:
+                t1, detections1 = refined[-1]
+                t2, detections2 = pending[-1]
+                if (
+                    t2 - t1 > _REFINE_INTERVAL
+                    and not detection_utils.result_list_almost_equal(
+                        detections1, detections2
+                    )
+                ):
+                    logging.info(f"Not equal: {(t1, detections1)}")
+                    logging.info(f"      And: {(t2, detections2)}")
+                    mid_time = (t1 + t2) / 2
+                    logging.info(f"Iterative refinement at {mid_time}")
+                    pending.append((mid_time, self._detect(clip, mid_time)))
+                    continue
+                refined.append(pending.pop())
+        return refined
 
     @override
     def process(
@@ -102,10 +120,13 @@ class OcrDetector(process_node.ProcessNode):
         source_file: str,
         out_file_stem: str,
     ) -> str:
-        movie = moviepy.VideoFileClip(source_file)
-
-        timed_detections = self._detect_time_series(movie)
-        self._iterative_refine(movie, timed_detections)
+        movie = frame_reader.FrameReader(source_file)
+        try:
+            timed_detections = self._iterative_refine(
+                movie, self._detect_time_series(movie)
+            )
+        finally:
+            movie.close()
 
         results: list[DetectionInterval] = []
         for t, detections in timed_detections:
@@ -129,7 +150,7 @@ class OcrDetector(process_node.ProcessNode):
         out_file_name = out_file_stem + ".ocr_detections.json"
 
         logging.info(f"Writing to {out_file_name!r}")
-        with open(out_file_name, "w") as f:
-            json.dump(results, f)
+        with open(out_file_name, "wb") as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_SERIALIZE_NUMPY))
 
         return out_file_name
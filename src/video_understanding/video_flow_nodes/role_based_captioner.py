@@ -1,6 +1,10 @@
-import json
+import dataclasses
 import logging
 
+from numpy import typing as npt
+import numpy as np
+import orjson
+
 from . import word_caption_utils
 from ...flow import process_node
 
@@ -16,6 +20,34 @@ class RoleAwareCaptionT(TypedDict):
     interval: tuple[float, float]
 
 
+@dataclasses.dataclass(frozen=True)
+class RoleAwareCaptionsSoA:
+    """Role aware captions, held as parallel arrays."""
+
+    speakers: list[str]
+    texts: list[str]
+    # Shape (N, 2), holding the start and end of each caption.
+    intervals: npt.NDArray[np.float64]
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @classmethod
+    def from_captions(cls, captions: list[RoleAwareCaptionT]) -> "RoleAwareCaptionsSoA":
+        return cls(
+            speakers=[c["speaker"] for c in captions],
+            texts=[c["text"] for c in captions],
+            intervals=np.array(
+                [c["interval"] for c in captions], dtype=np.float64
+            ).reshape(-1, 2),
+        )
+
+    @classmethod
+    def from_json(cls, file_name: str) -> "RoleAwareCaptionsSoA":
+        with open(file_name, "rb") as f:
+            return cls.from_captions(orjson.loads(f.read()))
+
+
 class RoleBasedCaptionsNode(process_node.ProcessNode):
     @override
     def process(
@@ -25,8 +57,8 @@ class RoleBasedCaptionsNode(process_node.ProcessNode):
         out_file_stem: str,
     ) -> str:
         out_file = out_file_stem + FILE_SUFFIX
-        with open(word_captions_file) as f:
-            diarized_captions = json.load(f)
+        with open(word_captions_file, "rb") as f:
+            diarized_captions = orjson.loads(f.read())
 
         logging.info(f"{identified_roles=}")
         captions = word_caption_utils.merge_word_captions(
@@ -34,7 +66,7 @@ class RoleBasedCaptionsNode(process_node.ProcessNode):
             speaker_aliases=identified_roles,
             unknown="Either",
         )
-        with open(out_file, "w") as f:
-            json.dump(captions, f)
+        with open(out_file, "wb") as f:
+            f.write(orjson.dumps(captions))
         logging.info(f"Written to {out_file}")
         return out_file
@@ -2,8 +2,11 @@ import functools
 import json
 import logging
 
+import orjson
+
 from . import word_caption_utils
 from .. import prompt_templates
+from .. import video_config
 from ...flow import process_node
 from ..llm_service import llm
 from ..llm_service import llm_utils
@@ -12,6 +15,8 @@ from ..utils import templater
 
 from typing import Any, override
 
+_VALID_ROLES = {"Teacher", "Student"}
+
 
 def _caption_to_str(captions: list[dict[str, Any]]) -> tuple[str, dict[str, str]]:
     """Convert a caption dictionary to a text representation."""
@@ -49,20 +54,19 @@ def _result_parser(
     Returns:
         Same as response, but drops unknown keys (e.g. "Person C").
     """
+    result: dict[str, str] = {}
     # Valid keys in LLM response. E.g. "Person A".
     for speaker_name in speaker_names:
-        if speaker_name not in response:
+        role = response.get(speaker_name)
+        if role is None:
             logging.warning(f"Response is missing speaker: {speaker_name}")
             return None
         # Capitalize the values to ensure consistency.
-        response[speaker_name] = response[speaker_name].strip().capitalize()
-        if response[speaker_name] not in ["Teacher", "Student"]:
-            logging.error(
-                f"Response value for {speaker_name} is not valid: {response[speaker_name]}"
-            )
+        role = role.strip().capitalize()
+        if role not in _VALID_ROLES:
+            logging.error(f"Response value for {speaker_name} is not valid: {role}")
             return None
-    # Remove any keys that are not in the valid keys.
-    result = {k: v for k, v in response.items() if k in speaker_names}
+        result[speaker_name] = role
     if not result:
         logging.error("No valid keys (e.g. 'Person A') found in the LLM response")
         return None
@@ -73,6 +77,8 @@ class RoleIdentifier(process_node.ProcessNode):
 
     def __init__(self):
         self._llm_instance = llm.OpenAiLlmInstance("o4-mini")
+        # Converts the response to JSON, so that o4-mini can reason freely.
+        self._json_formatter = llm.OpenAiLlmInstance("gpt-4.1-mini")
 
     @override
     def process(
@@ -83,8 +89,8 @@ class RoleIdentifier(process_node.ProcessNode):
         Returns:
             A dict for example {"SPEAKER_00": "Teacher", "SPEAKER_01": "Student"}.
         """
-        with open(word_captions_file, "r") as file:
-            data = json.load(file)
+        with open(word_captions_file, "rb") as file:
+            data = orjson.loads(file.read())
         # print(_to_caption_text(data))
 
         caption_text, speaker_aliases = _caption_to_str(data)
@@ -114,6 +120,17 @@ class RoleIdentifier(process_node.ProcessNode):
                 ),
             ],
             max_tokens=8192,
+            json_schema={
+                "type": "object",
+                "properties": {
+                    k: {"type": "string", "enum": ["Teacher", "Student"]}
+                    for k in speaker_unalias.keys()
+                },
+                "required": list(speaker_unalias.keys()),
+                "additionalProperties": False,
+            },
+            json_formatter=self._json_formatter,
+            cache_dir=video_config.LLM_CACHE_DIR,
             log_file=f"{out_file_stem}.role_assigner_llm_debug.txt",
             log_additional_info="\n".join([f"Speaker Aliases: {speaker_aliases!r}"]),
         )
@@ -124,3 +141,4 @@ class RoleIdentifier(process_node.ProcessNode):
 
     def finalize(self) -> None:
         self._llm_instance.finalize()
+        self._json_formatter.finalize()
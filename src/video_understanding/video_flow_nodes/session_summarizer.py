@@ -1,42 +1,26 @@
-import json
 import logging
 import os
 
-from . import role_based_captioner
-from . import video_quality_profiler
-from . import vision_processor
 from .. import prompt_templates
 from .. import video_config
 from ...flow import process_node
 from ..llm_service import llm
 from ..llm_service import llm_utils
 from ..utils import file_conventions
+from ..utils import misc_utils
 from ..utils import prompt_utils
 from ..utils import templater
 
 from typing import override
 
 
-def _summarize_prompt(
-    source_file: str,
-    task_description: str,
-    role_aware_summary: list[role_based_captioner.RoleAwareCaptionT],
-    scene_understanding: vision_processor.SceneListT | None,
-    bad_segments: list[video_quality_profiler.BadSegment],
-) -> list[str]:
+def _summarize_prompt(task_description: str, caption_lines: str) -> list[str]:
     """Stores student evaluations as a json file and returns the path."""
     return templater.fill(
         prompt_templates.SESSION_SUMMARIZE_PROMPT_TEMPLATE,
         {
             "task_description": task_description,
-            "caption_lines": "\n".join(
-                prompt_utils.caption_lines_for_prompt(
-                    source_file=source_file,
-                    role_aware_summary=role_aware_summary,
-                    scene_understanding=scene_understanding,
-                    bad_segments=bad_segments,
-                )
-            ),
+            "caption_lines": caption_lines,
         },
     )
 
@@ -58,39 +42,18 @@ class SessionSummarizer(process_node.ProcessNode):
         scene_understanding_file: str | None,
         bad_video_segments_file: str,
     ) -> str:
-        with open(role_aware_summary_file, "r") as f:
-            role_aware_summary: list[role_based_captioner.RoleAwareCaptionT] = (
-                json.load(f)
-            )
-
         task_description = file_conventions.filename_to_task(source_file)
 
-        scene_understanding: vision_processor.SceneListT | None = None
-        if video_config.ENABLE_VISION:
-            if scene_understanding_file is None:
-                raise ValueError(
-                    "Vision is enabled, so scene_understanding_file must be provided."
-                )
-            with open(scene_understanding_file, "r") as f:
-                scene_understanding = vision_processor.SceneListT.model_validate_json(
-                    f.read()
-                )
-
-        with open(bad_video_segments_file, "r") as f:
-            bad_segments: list[video_quality_profiler.BadSegment] = json.load(f)
-
-        prompt = _summarize_prompt(
+        # Shared with the highlights nodes of the video.
+        caption_lines = prompt_utils.caption_text_for_files(
             source_file=source_file,
-            task_description=task_description,
-            role_aware_summary=role_aware_summary,
-            scene_understanding=scene_understanding,
-            bad_segments=bad_segments,
+            role_aware_summary_file=role_aware_summary_file,
+            scene_understanding_file=scene_understanding_file,
+            bad_video_segments_file=bad_video_segments_file,
         )
 
-        response_str = self._llm_instance.do_prompt_and_parse(
-            "\n".join(prompt),
-            transformers=[llm_utils.parse_as_markdown],
-            max_tokens=4096,
+        prompt = _summarize_prompt(
+            task_description=task_description, caption_lines=caption_lines
         )
 
         # To make video summaries easier to find than other logs -
@@ -107,6 +70,17 @@ class SessionSummarizer(process_node.ProcessNode):
 
         os.makedirs(os.path.dirname(out_file_name), exist_ok=True)
 
+        # The raw response is streamed into the file, so that it can be read
+        # while being generated. It is replaced with the parsed response below.
+        response_str = self._llm_instance.do_prompt_and_parse(
+            "\n".join(prompt),
+            transformers=[llm_utils.parse_as_markdown],
+            max_tokens=4096,
+            stream_file=out_file_name,
+            cache_dir=video_config.LLM_CACHE_DIR,
+            prompt_cache_key=misc_utils.fingerprint(caption_lines),
+        )
+
         with open(out_file_name, "w") as f:
             f.write(response_str)
         logging.info(f"Session summary written to {out_file_name}")
@@ -1,5 +1,8 @@
-import json
 import logging
+import operator
+
+import numpy as np
+import orjson
 
 from . import transcriber
 from ...flow import process_node
@@ -9,6 +12,7 @@ import typing
 from typing import override, TypedDict
 
 _BREAK_SENTENCE_TIME = 0.5  # Seconds of silence to break sentences.
+_SENTENCE_END_CHARS = [".", "?", "!"]
 
 
 class _SpeakerWordT(TypedDict):
@@ -28,27 +32,20 @@ class SpeakerCaptionT(TypedDict):
 def _split_to_sentences(
     words: list[transcriber.TranscriptionWordT],
 ) -> list[list[transcriber.TranscriptionWordT]]:
-    sentences: list[list[transcriber.TranscriptionWordT]] = []
-    current: list[transcriber.TranscriptionWordT] = []  # Current sentence.
-    last_word: transcriber.TranscriptionWordT | None = None
-    for word_dict in words:
-        word = word_dict["text"]
-        current.append(word_dict)
-        break_here = False
-
-        if last_word is not None:
-            if last_word["end"] + _BREAK_SENTENCE_TIME < word_dict["start"]:
-                break_here = True
-
-        if word.endswith(".") or word.endswith("?") or word.endswith("!"):
-            break_here = True
-
-        if break_here:
-            sentences.append(current)
-            current = []
-    if current:
-        sentences.append(current)
-    return sentences
+    if not words:
+        return []
+    starts = np.fromiter((w["start"] for w in words), float, count=len(words))
+    ends = np.fromiter((w["end"] for w in words), float, count=len(words))
+    last_chars = np.array([w["text"][-1:] for w in words])
+
+    # Break after a word with terminal punctuation, or if it is followed by a
+    # long enough silence.
+    breaks = (ends[:-1] + _BREAK_SENTENCE_TIME < starts[1:]) | np.isin(
+        last_chars[:-1], _SENTENCE_END_CHARS
+    )
+    slice_ends = np.flatnonzero(breaks) + 1
+    boundaries = [0, *slice_ends.tolist(), len(words)]
+    return [words[a:b] for a, b in zip(boundaries, boundaries[1:])]
 
 
 class SpeakerAssigner(process_node.ProcessNode):
@@ -61,12 +58,12 @@ class SpeakerAssigner(process_node.ProcessNode):
     ) -> str:
         """Stores assigned captions as a json file and returns the file name."""
         out_file = out_file_stem + ".assigned_captions.json"
-        with open(captions_file) as f:
-            captions: list[transcriber.TranscriptionT] = json.load(f)
-        with open(diarization_file) as f:
-            diarizations = json.load(f)
+        with open(captions_file, "rb") as f:
+            captions: list[transcriber.TranscriptionT] = orjson.loads(f.read())
+        with open(diarization_file, "rb") as f:
+            diarizations = orjson.loads(f.read())
 
-        diarization_scanner = interval_scanner.IntervalScanner(diarizations)
+        diarization_index = interval_scanner.IntervalIndex(diarizations)
 
         for caption in captions:
             # Caption has the format -
@@ -122,7 +119,7 @@ class SpeakerAssigner(process_node.ProcessNode):
                 start, end = sentence[0]["start"], sentence[-1]["end"]
 
                 speaker_weights: dict[str, float] = {}
-                for segment in diarization_scanner.overlapping_intervals(start, end):
+                for segment in diarization_index.overlapping_intervals(start, end):
                     # Consider the lengt of intersection between [start, end] and the diarized interval.
                     dia_length = min(end, segment["interval"][1]) - max(
                         start, segment["interval"][0]
@@ -131,10 +128,11 @@ class SpeakerAssigner(process_node.ProcessNode):
                         speaker_weights.get(segment["speaker"], 0) + dia_length
                     )
                 if speaker_weights:
-                    # Assign the speaker with most amount of time spoken.
+                    # Assign the speaker with most amount of time spoken. Ties go
+                    # to the speaker seen first.
                     sentence_speaker = max(
-                        speaker_weights, key=lambda x: speaker_weights[x]
-                    )
+                        speaker_weights.items(), key=operator.itemgetter(1)
+                    )[0]
                 else:
                     sentence_speaker = ""
 
@@ -150,7 +148,7 @@ class SpeakerAssigner(process_node.ProcessNode):
         # the data we will write.
         out_captions = typing.cast(list[SpeakerCaptionT], captions)
 
-        with open(out_file, "w") as f:
-            json.dump(out_captions, f)
+        with open(out_file, "wb") as f:
+            f.write(orjson.dumps(out_captions))
         logging.info(f"Written to {out_file}")
         return out_file
@@ -0,0 +1,40 @@
+import unittest
+
+from . import speaker_assigner
+
+# pyright: reportPrivateUsage=false
+
+
+def _word(text: str, start: float, end: float):
+    return {"text": text, "start": start, "end": end, "confidence": 1.0}
+
+
+class TestSpeakerAssigner(unittest.TestCase):
+
+    def test_split_to_sentences(self):
+        words = [
+            _word("Hello.", 0.0, 0.5),
+            _word("How", 0.6, 0.8),
+            _word("are", 0.9, 1.1),
+            _word("you?", 1.2, 1.4),
+            _word("Fine", 1.5, 1.7),
+            # Long silence before this word.
+            _word("and", 3.0, 3.2),
+            _word("you", 3.3, 3.5),
+        ]
+        sentences = speaker_assigner._split_to_sentences(words)  # type: ignore
+        self.assertEqual(
+            [[w["text"] for w in s] for s in sentences],
+            [["Hello."], ["How", "are", "you?"], ["Fine"], ["and", "you"]],
+        )
+
+    def test_split_to_sentences_empty(self):
+        self.assertEqual(speaker_assigner._split_to_sentences([]), [])
+        sentences = speaker_assigner._split_to_sentences(
+            [_word("", 0.0, 0.1), _word("Hi", 0.2, 0.3)]  # type: ignore
+        )
+        self.assertEqual(len(sentences), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
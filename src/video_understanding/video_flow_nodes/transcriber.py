@@ -1,12 +1,12 @@
-import json
 import logging
-import os
-import subprocess
 
-import whisper_timestamped as whisper  # type: ignore
+import faster_whisper  # type: ignore
+from numpy import typing as npt
+import numpy as np
+import orjson
+import soundfile  # type: ignore
 
 from . import voice_separator
-from .. import video_config
 from ...flow import process_node
 from ..utils import misc_utils
 
@@ -16,6 +16,13 @@ from typing import NotRequired, override, TypedDict
 # Skipping a minimum ensures that we don't get stuck in a loop.
 _ON_ERROR_SKIP = 0.5
 
+# Sample rate of the audio given to Whisper. The wav from get_wav() is already
+# 16kHz mono, so it can be read without resampling.
+_SAMPLE_RATE = 16000
+
+# Words ending in these indicate sentence structure in a caption.
+_PUNCTUATIONS = (",", "?", ".")
+
 
 # E.g. [{"interval": [0.0, 2.5], "text": "Hi there"}, ...]
 class TranscriptionWordT(TypedDict):
@@ -37,14 +44,14 @@ class TranscriptionT(TypedDict):
 
 def _text_is_rolling(text: str) -> bool:
     # A 'rolling' caption is when the transcriber fails to detect sentence breaks.
-    words = [w.strip() for w in text.split()]
+    words = text.split()
     # Checked that the word length is <= 51 for good captioning.
     # So > 60 triggering should be precise.
     #
     # NOTE: See also _split_long_sentences() in transcription_refiner.py.
     # The presence of ",?." indicate proper sentence structure, so no breaking issue with transcription.
     # However, the sentence can be broken up, as in that method.
-    return len(words) > 60 and not any(word and word[-1] in ",?." for word in words)
+    return len(words) > 60 and not any(word.endswith(_PUNCTUATIONS) for word in words)
 
 
 def _find_rolling_segment_index(transcription: list[TranscriptionT]) -> int | None:
@@ -57,9 +64,12 @@ def _find_rolling_segment_index(transcription: list[TranscriptionT]) -> int | No
 
 def _find_repetition_index(transcription: list[TranscriptionT]) -> int | None:
     # If text starts repeating, returns the index at which repetition starts.
-    for i in range(len(transcription) - 2):
+    # Compare hashes first, which are computed once per text.
+    hashes = [hash(segment["text"]) for segment in transcription]
+    for i, (h0, h1, h2) in enumerate(zip(hashes, hashes[1:], hashes[2:])):
         if (
-            transcription[i]["text"]
+            h0 == h1 == h2
+            and transcription[i]["text"]
             == transcription[i + 1]["text"]
             == transcription[i + 2]["text"]
         ):
@@ -87,45 +97,29 @@ def _find_bad_index(
     return None, None
 
 
-# Cuts audio to a tempfile.
-def _cut_audio(input_file: str, start: float) -> str:
-    temp_file = video_config.tempdir() / "temp_cut_for_transcription.wav"
-    command = [
-        "ffmpeg",
-        "-y",
-        "-i",
-        input_file,
-        "-ss",
-        str(start),
-        str(temp_file),
-    ]
-    subprocess.run(command, check=True)
-    return str(temp_file)
-
-
-# TODO: Unittest this.
 def _shift_transcription_timestamp(
     transcription: list[TranscriptionT], shift: float
 ) -> list[TranscriptionT]:
-    return [
-        {
-            "interval": (
-                round(segment["interval"][0] + shift, 2),
-                round(segment["interval"][1] + shift, 2),
-            ),
-            "text": segment["text"],
-            "words": [
-                {
-                    "text": word["text"],
-                    "start": round(word["start"] + shift, 2),
-                    "end": round(word["end"] + shift, 2),
-                    "confidence": word["confidence"],
-                }
-                for word in segment["words"]
-            ],
-        }
-        for segment in transcription
-    ]
+    """Shifts all times by `shift` seconds, in place, and returns it."""
+    intervals = np.array(
+        [segment["interval"] for segment in transcription], dtype=np.float64
+    ).reshape(-1, 2)
+    for segment, (start, end) in zip(
+        transcription, np.round(intervals + shift, 2).tolist()
+    ):
+        segment["interval"] = (start, end)
+
+    words = [word for segment in transcription for word in segment["words"]]
+    starts = np.fromiter((w["start"] for w in words), np.float64, count=len(words))
+    ends = np.fromiter((w["end"] for w in words), np.float64, count=len(words))
+    for word, start, end in zip(
+        words,
+        np.round(starts + shift, 2).tolist(),
+        np.round(ends + shift, 2).tolist(),
+    ):
+        word["start"] = start
+        word["end"] = end
+    return transcription
 
 
 class WhisperTranscribe(process_node.ProcessNode):
@@ -133,41 +127,40 @@ class WhisperTranscribe(process_node.ProcessNode):
         # The large-v3-turbo appears to do on par with large-v3 for English.
         # See https://github.com/openai/whisper/discussions/2363
         # For the original models, see also pg. 22 here: https://arxiv.org/abs/2212.04356
-        self._model = whisper.load_model("large-v3-turbo", device="cuda")
+        # The int8 weights with fp16 activations halve the memory, and speed up
+        # both the encoder and decoder.
+        self._model = faster_whisper.WhisperModel(
+            "large-v3-turbo", device="cuda", compute_type="int8_float16"
+        )
 
-    def _transcribe_raw(self, local_path: str) -> list[TranscriptionT]:
-        logging.info(f"Transcribing {local_path!r}...")
+    def _transcribe_raw(self, audio: npt.NDArray[np.float32]) -> list[TranscriptionT]:
+        logging.info(f"Transcribing {len(audio) / _SAMPLE_RATE:.1f}s of audio...")
         # Note: The initial_prompt is in an attempt to make it output sentence
         # structure. See https://github.com/openai/whisper/discussions/194
-        model_result = whisper.transcribe(
-            self._model, local_path, language="en", initial_prompt="Okay."
+        segments, _ = self._model.transcribe(
+            audio,
+            language="en",
+            initial_prompt="Okay.",
+            word_timestamps=True,
+            vad_filter=True,
         )
-        transcription: list[TranscriptionT] = []
-        for segment in model_result["segments"]:
-            if "words" in segment:
-                words: list[TranscriptionWordT] = segment["words"]
-            else:
-                # Sometimes, DTW may not work.
-                # As a fallback use the full sentence.
-                # These captions can be searched with confidence = 0.0.
-                logging.warning(f'No "words" transcription in {segment=}')
-                words: list[TranscriptionWordT] = [
+        # Segments are decoded lazily as this is iterated.
+        return [
+            {
+                "interval": (segment.start, segment.end),
+                "text": segment.text,
+                "words": [
                     {
-                        "start": segment["start"],
-                        "end": segment["end"],
-                        "text": segment["text"],
-                        "confidence": 0.0,
+                        "text": word.word.strip(),
+                        "start": word.start,
+                        "end": word.end,
+                        "confidence": round(word.probability, 3),
                     }
-                ]
-
-            transcription.append(
-                {
-                    "interval": (segment["start"], segment["end"]),
-                    "text": segment["text"],
-                    "words": words,
-                }
-            )
-        return transcription
+                    for word in segment.words
+                ],
+            }
+            for segment in segments
+        ]
 
     # Transcribe with safeguards.
     # Note: Though infrequently, Whisper can get stuck on some words. Using
@@ -177,35 +170,20 @@ class WhisperTranscribe(process_node.ProcessNode):
     # 2. Detect where it went bad. If not, return.
     # 3. Transcribe from where it went bad, and repeat.
     def _transcribe_with_guards(self, local_path: str) -> list[TranscriptionT]:
+        # Read once. Restarts transcribe a slice of it, instead of cutting the
+        # file again.
+        audio, sample_rate = soundfile.read(local_path, dtype="float32")
+        if sample_rate != _SAMPLE_RATE or audio.ndim != 1:
+            raise ValueError(
+                f"Expected {_SAMPLE_RATE}Hz mono audio, got {sample_rate}Hz with shape {audio.shape}"
+            )
         start_time: float = 0.0
         transcription_so_far: list[TranscriptionT] = []
         cut_reason: str | None = None
         while True:
-            path = local_path
-            temp_file_to_delete: str | None = None
-            if start_time > 0:
-                temp_file_to_delete = _cut_audio(local_path, start_time)
-                path = temp_file_to_delete
-            try:
-                transcription = self._transcribe_raw(path)
-            except AssertionError as e:
-                error_message = str(e)
-                if "Inconsistent number of segments" in error_message:
-                    # Following error was seen when processing a file -
-                    #   File "/path/to/python3.10/site-packages/whisper_timestamped/transcribe.py", line 310, in transcribe_timestamped
-                    #     (transcription, words) = _transcribe_timestamped_efficient(model, audio,
-                    #   File "/path/to/python3.10/site-packages/whisper_timestamped/transcribe.py", line 936, in _transcribe_timestamped_efficient
-                    #     assert l1 == l2 or l1 == 0, f"Inconsistent number of segments: whisper_segments ({l1}) != timestamped_word_segments ({l2})"
-                    # AssertionError: Inconsistent number of segments: whisper_segments (429) != timestamped_word_segments (428)
-                    logging.warning(
-                        f"Caught assertion error, retrying: {error_message}"
-                    )
-                    start_time += _ON_ERROR_SKIP
-                    continue
-                else:
-                    raise
-            if temp_file_to_delete is not None:
-                os.remove(temp_file_to_delete)
+            transcription = self._transcribe_raw(
+                audio[int(start_time * _SAMPLE_RATE) :]
+            )
             if start_time > 0:
                 transcription = _shift_transcription_timestamp(
                     transcription, start_time
@@ -240,6 +218,6 @@ class WhisperTranscribe(process_node.ProcessNode):
         out_file = f"{out_file_stem}.transcription.{misc_utils.timestamp_str()}.json"
         with voice_separator.get_wav(source_file) as source_file:
             transcription = self._transcribe_with_guards(source_file)
-        with open(out_file, "w") as f:
-            json.dump(transcription, f)
+        with open(out_file, "wb") as f:
+            f.write(orjson.dumps(transcription, option=orjson.OPT_SERIALIZE_NUMPY))
         return out_file
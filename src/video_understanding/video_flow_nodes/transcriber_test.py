@@ -0,0 +1,41 @@
+import unittest
+
+from . import transcriber
+
+# pyright: reportPrivateUsage=false
+
+
+class TestTranscriber(unittest.TestCase):
+
+    def test_shift_transcription_timestamp(self):
+        transcription: list[transcriber.TranscriptionT] = [
+            {
+                "interval": (0.0, 1.5),
+                "text": " Hello there.",
+                "words": [
+                    {"text": "Hello", "start": 0.0, "end": 0.61, "confidence": 0.9},
+                    {"text": "there.", "start": 0.7, "end": 1.5, "confidence": 0.8},
+                ],
+            },
+            {"interval": (2.0, 2.5), "text": " Hi.", "words": []},
+        ]
+        shifted = transcriber._shift_transcription_timestamp(transcription, 10.123)
+        self.assertEqual(shifted[0]["interval"], (10.12, 11.62))
+        self.assertEqual(
+            [(w["start"], w["end"]) for w in shifted[0]["words"]],
+            [(10.12, 10.73), (10.82, 11.62)],
+        )
+        self.assertEqual(shifted[0]["words"][1]["confidence"], 0.8)
+        self.assertEqual(shifted[1]["interval"], (12.12, 12.62))
+
+    def test_find_repetition_index(self):
+        transcription: list[transcriber.TranscriptionT] = [
+            {"interval": (i, i + 1), "text": text, "words": []}
+            for i, text in enumerate(["a", "b", "b", "c", "c", "c", "d"])
+        ]
+        self.assertEqual(transcriber._find_repetition_index(transcription), 3)
+        self.assertIsNone(transcriber._find_repetition_index(transcription[:5]))
+
+
+if __name__ == "__main__":
+    unittest.main()
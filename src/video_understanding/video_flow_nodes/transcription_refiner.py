@@ -1,12 +1,14 @@
 # Sometimes. Whisper appears to create incorrect starting point, spanning 10s of seconds.
 # This will attempt to correct those silences.
-import json
 import logging
 
+from numpy import typing as npt
+import numpy as np
+import orjson
+
 from . import transcriber
 from . import voice_separator
 from ...flow import process_node
-from ..utils import interval_scanner
 from ..utils import misc_utils
 
 from typing import Iterable, Iterator, override
@@ -25,21 +27,50 @@ _MIN_SENTENCE_LENGTH = 0.5
 _SPLIT_AFTER_WORDS = 20
 # Will not split if remaining words are <= this count.
 _NO_SPLIT_IF_REMAINING = 8
-
-
-def _union_intervals(intervals: list[tuple[float, float]]):
-    intervals.sort()
-    result: list[tuple[float, float]] = []
-    for start, end in intervals:
-        if not result:
-            result.append((start, end))
-            continue
-        last_start, last_end = result[-1]
-        if start <= last_end:
-            result[-1] = (last_start, max(last_end, end))
-        else:
-            result.append((start, end))
-    return result
+# Words ending in these are where a long caption may be split.
+_SENTENCE_ENDS = ("?", ".")
+
+# Tolerance for intervals that just touch, same as in interval_scanner.
+_EPSILON = 1e-5
+
+
+def _union_intervals(
+    intervals: list[tuple[float, float]],
+) -> list[tuple[float, float]]:
+    if not intervals:
+        return []
+    arr = np.array(intervals, dtype=np.float64)
+    arr = arr[arr[:, 0].argsort(kind="stable")]
+    max_ends = np.maximum.accumulate(arr[:, 1])
+    # An interval starts a new group if it begins after all earlier ones end.
+    is_first = np.empty(len(arr), dtype=np.bool_)
+    is_first[0] = True
+    is_first[1:] = arr[1:, 0] > max_ends[:-1]
+    firsts = np.flatnonzero(is_first)
+    lasts = np.append(firsts[1:] - 1, len(arr) - 1)
+    return list(zip(arr[firsts, 0].tolist(), max_ends[lasts].tolist()))
+
+
+def _speech_bounds(
+    speech_times: list[tuple[float, float]], intervals: npt.NDArray[np.float64]
+) -> list[tuple[float, float] | None]:
+    """For each interval, the start and end of all speech overlapping it.
+
+    The speech_times must be disjoint and sorted, as from _union_intervals().
+    None is returned for the intervals that do not overlap any speech.
+    """
+    if not speech_times:
+        return [None] * len(intervals)
+    speech = np.array(speech_times, dtype=np.float64)
+    # Since the speech times are disjoint, they are sorted by end as well.
+    first = np.searchsorted(speech[:, 1], intervals[:, 0] - _EPSILON, side="left")
+    last = np.searchsorted(speech[:, 0], intervals[:, 1] + _EPSILON, side="right") - 1
+    speech_starts = speech[:, 0].tolist()
+    speech_ends = speech[:, 1].tolist()
+    return [
+        (speech_starts[i], speech_ends[j]) if i <= j else None
+        for i, j in zip(first.tolist(), last.tolist())
+    ]
 
 
 # Combined function to trim start or end.
@@ -61,20 +92,21 @@ def _trim_caption(
     caption["interval"] = (new_start, new_end)
 
     # Combine words whose intervals no longer overlap with (new_start, new_end).
-    new_words: list[transcriber.TranscriptionWordT] = []
-    for word in caption["words"]:
+    # The kept words are compacted to the front of the list, in place.
+    words = caption["words"]
+    last = -1  # Index of the last kept word.
+    for word in words:
         word["start"] = max(word["start"], new_start)
         word["end"] = min(word["end"], new_end)
-        if not new_words:
-            new_words.append(word)
-            continue
-        last_word = new_words[-1]
-        if last_word["end"] <= new_start or word["start"] >= new_end:
-            last_word["text"] += " " + word["text"]
-            last_word["end"] = word["end"]
-            continue
-        new_words.append(word)
-    caption["words"] = new_words
+        if last >= 0:
+            last_word = words[last]
+            if last_word["end"] <= new_start or word["start"] >= new_end:
+                last_word["text"] += " " + word["text"]
+                last_word["end"] = word["end"]
+                continue
+        last += 1
+        words[last] = word
+    del words[last + 1 :]
 
 
 def _trim_start(caption: transcriber.TranscriptionT, new_start: float) -> None:
@@ -94,6 +126,7 @@ def _split_long_captions(
         if len(words) <= _SPLIT_AFTER_WORDS:
             yield caption
             continue
+        word_texts = [x["text"] for x in words]
 
         # Reconstruct using the words.
         def reconstruct(start_index: int, end_index: int) -> transcriber.TranscriptionT:
@@ -102,11 +135,8 @@ def _split_long_captions(
                 logging.info(f"Returning full caption at {caption['interval']=}")
                 return caption
 
-            full_text = "".join(
-                # The " " prefix is how Whisper does it, because there is always a space before sentence starts.
-                " " + x["text"]
-                for x in words[start_index:end_index]
-            )
+            # The " " prefix is how Whisper does it, because there is always a space before sentence starts.
+            full_text = " " + " ".join(word_texts[start_index:end_index])
             result: transcriber.TranscriptionT = {
                 "interval": (words[start_index]["start"], words[end_index - 1]["end"]),
                 "text": full_text,
@@ -124,9 +154,9 @@ def _split_long_captions(
 
         start_i = 0
         for end_i in range(len(words) - _NO_SPLIT_IF_REMAINING):
-            word = words[end_i]["text"]
+            word = word_texts[end_i]
             if end_i + 1 - start_i >= _SPLIT_AFTER_WORDS:
-                if word[-1] in "?.":
+                if word.endswith(_SENTENCE_ENDS):
                     yield reconstruct(start_i, end_i + 1)
                     start_i = end_i + 1
         if start_i < len(words) - 1:
@@ -143,9 +173,9 @@ class TranscriptionRefiner(process_node.ProcessNode):
     ) -> str:
         """Stores assigned captions as a json file and returns the file name."""
         logging.info(f"Correcting transcriptions for {captions_file!r}...")
-        with open(captions_file) as f:
-            captions: list[transcriber.TranscriptionT] = json.load(f)
-        with open(diarization_file) as f:
+        with open(captions_file, "rb") as f:
+            captions: list[transcriber.TranscriptionT] = orjson.loads(f.read())
+        with open(diarization_file, "rb") as f:
             diarizations = voice_separator.DiarizationListT.model_validate_json(
                 f.read()
             )
@@ -155,28 +185,26 @@ class TranscriptionRefiner(process_node.ProcessNode):
         ]
         speech_times = _union_intervals(speech_times)
 
-        speech_scanner = interval_scanner.IntervalScanner(
-            [{"interval": x} for x in speech_times]
+        split_captions = list(_split_long_captions(captions))
+        all_speech_bounds = _speech_bounds(
+            speech_times,
+            np.array([x["interval"] for x in split_captions], dtype=np.float64).reshape(
+                -1, 2
+            ),
         )
 
         corrected_captions: list[transcriber.TranscriptionT] = []
-        for caption in _split_long_captions(captions):
+        for caption, speech_bounds in zip(split_captions, all_speech_bounds):
             start, end = caption["interval"]
             logging.info(f"{start=} {end=} {caption['text']=}")
-            speech_intervals = speech_scanner.overlapping_intervals(start, end)
-            if not speech_intervals:
+            if speech_bounds is None:
                 # Too many of these to make it a logging.warning().
                 # logging.info(f"No speech time intersects with {caption=}")
                 continue
             # If caption starts or ends with a long silence, trim it.
             # Note: This doesn't take into account if there is long silence after a first short speech.
             # However, I have not seen that kind of error out of Whisper yet.
-
-            # Note: Intervals are not sorted! So following won't work -
-            # speech_start = speech_intervals[0]["interval"][0]
-            # speech_end = speech_intervals[-1]["interval"][1]
-            speech_start = min(x["interval"][0] for x in speech_intervals)
-            speech_end = max(x["interval"][1] for x in speech_intervals)
+            speech_start, speech_end = speech_bounds
 
             if start < speech_start - _SILENCE_THRESHOLD:
                 _trim_start(caption, speech_start - _MAINTAIN_SILENCE)
@@ -195,7 +223,7 @@ class TranscriptionRefiner(process_node.ProcessNode):
         out_file = (
             f"{out_file_stem}.captions_corrected.{misc_utils.timestamp_str()}.json"
         )
-        with open(out_file, "w") as f:
-            json.dump(corrected_captions, f)
+        with open(out_file, "wb") as f:
+            f.write(orjson.dumps(corrected_captions))
 
         return out_file
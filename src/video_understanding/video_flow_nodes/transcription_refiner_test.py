@@ -1,6 +1,7 @@
-import copy
 import unittest
 
+import numpy as np
+
 from . import transcriber
 from . import transcription_refiner
 
@@ -9,16 +10,20 @@ from typing import Final
 # Access private methods for tests.
 # pyright: reportPrivateUsage=false
 
-_TEST_CAPTION: transcriber.TranscriptionT = {
-    "text": "Hello, how are you?",
-    "interval": (5.0, 9.0),
-    "words": [
-        {"text": "Hello", "start": 5.0, "end": 6.0, "confidence": 0.9},
-        {"text": "how", "start": 6.0, "end": 7.0, "confidence": 0.9},
-        {"text": "are", "start": 7.0, "end": 8.0, "confidence": 0.9},
-        {"text": "you?", "start": 8.0, "end": 9.0, "confidence": 0.9},
-    ],
-}
+
+def _make_test_caption() -> transcriber.TranscriptionT:
+    # A fresh caption each time, since the tests modify it.
+    return {
+        "text": "Hello, how are you?",
+        "interval": (5.0, 9.0),
+        "words": [
+            {"text": "Hello", "start": 5.0, "end": 6.0, "confidence": 0.9},
+            {"text": "how", "start": 6.0, "end": 7.0, "confidence": 0.9},
+            {"text": "are", "start": 7.0, "end": 8.0, "confidence": 0.9},
+            {"text": "you?", "start": 8.0, "end": 9.0, "confidence": 0.9},
+        ],
+    }
+
 
 # Convenient shorthand.
 _MIN_SENTENCE_LENGTH: Final[float] = transcription_refiner._MIN_SENTENCE_LENGTH
@@ -36,8 +41,30 @@ class TestTranscriptionRefiner(unittest.TestCase):
         ]
         self.assertEqual(actual_words, expected)
 
+    def test_union_intervals(self):
+        self.assertEqual(transcription_refiner._union_intervals([]), [])
+        self.assertEqual(
+            transcription_refiner._union_intervals(
+                [(5.0, 6.0), (0.0, 2.0), (1.0, 1.5), (2.0, 3.0), (4.0, 4.5)]
+            ),
+            [(0.0, 3.0), (4.0, 4.5), (5.0, 6.0)],
+        )
+
+    def test_speech_bounds(self):
+        speech_times = [(0.0, 3.0), (4.0, 4.5), (5.0, 6.0)]
+        intervals = np.array(
+            [(1.0, 2.0), (2.0, 5.5), (3.2, 3.8), (6.0, 7.0), (-2.0, -1.0)]
+        )
+        self.assertEqual(
+            transcription_refiner._speech_bounds(speech_times, intervals),
+            [(0.0, 3.0), (0.0, 6.0), None, (5.0, 6.0), None],
+        )
+        self.assertEqual(
+            transcription_refiner._speech_bounds([], intervals), [None] * 5
+        )
+
     def test_trim_start_normal(self):
-        caption = copy.deepcopy(_TEST_CAPTION)
+        caption = _make_test_caption()
         transcription_refiner._trim_start(caption, 5.1)
         self.assertEqual(caption["interval"][0], 5.1)
         expected = [
@@ -49,7 +76,7 @@ class TestTranscriptionRefiner(unittest.TestCase):
         self._check_words(caption, expected)
 
     def test_trim_start_past_first_word_end(self):
-        caption = copy.deepcopy(_TEST_CAPTION)
+        caption = _make_test_caption()
         transcription_refiner._trim_start(caption, 7.2)
         self.assertEqual(caption["interval"][0], 7.2)
         expected = [
@@ -59,7 +86,7 @@ class TestTranscriptionRefiner(unittest.TestCase):
         self._check_words(caption, expected)
 
     def test_trim_end_normal(self):
-        caption = copy.deepcopy(_TEST_CAPTION)
+        caption = _make_test_caption()
         # Try to trim to 8.9, which is within the last word ("you?": start=8.0, end=9.0)
         transcription_refiner._trim_end(caption, 8.9)
         self.assertEqual(caption["interval"][1], 8.9)
@@ -72,7 +99,7 @@ class TestTranscriptionRefiner(unittest.TestCase):
         self._check_words(caption, expected)
 
     def test_trim_end_before_last_word_start(self):
-        caption = copy.deepcopy(_TEST_CAPTION)
+        caption = _make_test_caption()
         # Try to trim to 7.1, which is before last word's start (8.0), so should clamp to 8.5 (8.0 + _MIN_SENTENCE_LENGTH)
         transcription_refiner._trim_end(caption, 7.1)
         self.assertEqual(caption["interval"][1], 7.1)
@@ -1,15 +1,17 @@
+import functools
+import itertools
 import json
 import logging
 import time
 
-import moviepy
+import cv2
 import numpy as np
 import numpy.typing as npt
 from pyannote import audio  # type: ignore
 
 from ...flow import process_node
 
-from typing import override, TypedDict
+from typing import Iterable, override, TypedDict
 
 # Difference than this will be considered same frame.
 _RMSE_THRESHOLD = 0.0001
@@ -23,68 +25,129 @@ _NON_STILL_TIME_THRESHOLD = 10.0
 # Ignore choppy segments if it is shorter than this length.
 _CHOPPINESS_LENGTH_THRESHOLD = 1.5
 
+# Number of random pixel values compared first, to quickly tell changed frames.
+_NUM_RANDOM_SAMPLES = 512
+
+# Stride of the pixel sample compared next, if the random ones are the same.
+_SAMPLE_STRIDE = 8
+
+
+def _rmse(frame: npt.NDArray[np.uint8], last_frame: npt.NDArray[np.uint8]) -> float:
+    # OpenCV sums the squared differences in one pass, without temporaries or
+    # the uint8 wrap-around of NumPy subtraction.
+    return (cv2.norm(frame, last_frame, cv2.NORM_L2SQR) / frame.size) ** 0.5
+
+
+@functools.lru_cache(maxsize=1)
+def _random_sample_indices(size: int) -> npt.NDArray[np.int64]:
+    # Without replacement, so that no difference is counted twice.
+    rng = np.random.default_rng(0)
+    indices = rng.choice(size, min(size, _NUM_RANDOM_SAMPLES), replace=False)
+    return np.sort(indices)
+
+
+def _is_same_frame(
+    frame: npt.NDArray[np.uint8], last_frame: npt.NDArray[np.uint8]
+) -> bool:
+    # Each differing pixel value adds at least 1 to the sum of squared errors.
+    # A changed frame usually shows in a sparse sample. Differences in the
+    # sample are a subset of all differences, so this does not miss any.
+    max_different = _RMSE_THRESHOLD**2 * frame.size
+    indices = _random_sample_indices(frame.size)
+    num_different = np.count_nonzero(
+        frame.ravel()[indices] != last_frame.ravel()[indices]
+    )
+    if num_different >= max_different:
+        return False
+    sample = np.s_[::_SAMPLE_STRIDE, ::_SAMPLE_STRIDE]
+    num_different = np.count_nonzero(frame[sample] != last_frame[sample])
+    if num_different >= max_different:
+        return False
+    return _rmse(frame, last_frame) < _RMSE_THRESHOLD
+
 
 class BadSegment(TypedDict):
     interval: tuple[float, float]
     reason: str
 
 
+def _merge_still_segment(
+    open_segment: tuple[float, float] | None, segment: tuple[float, float]
+) -> tuple[tuple[float, float] | None, tuple[float, float] | None]:
+    """Merges the next still segment into the open (last) choppy segment.
+
+    Returns the new open segment, and the previous one if it is now closed.
+    """
+    # Ignore small choppy segments.
+    if segment[1] - segment[0] <= _STUTTER_THRESHOLD:
+        return open_segment, None
+    if open_segment is None:
+        return segment, None
+    # Merge with previous if the gap of non-choppiness is too small.
+    if segment[0] - open_segment[1] <= _NON_STILL_TIME_THRESHOLD:
+        return (open_segment[0], segment[1]), None
+    return segment, open_segment
+
+
+def _to_bad_segments(
+    segments: Iterable[tuple[float, float] | None],
+) -> list[BadSegment]:
+    # Drop all the short choppy sections.
+    return [
+        {
+            "interval": segment,
+            "reason": "choppiness",
+        }
+        for segment in segments
+        if segment is not None
+        and segment[1] - segment[0] > _CHOPPINESS_LENGTH_THRESHOLD
+    ]
+
+
 class _ChoppinessDetector:
     def __init__(self):
-        self._still_segments: list[tuple[float, float]] = []
+        # Starts and ends of the still segments. The last one is extended in
+        # place while the frames stay the same.
+        self._still_starts: list[float] = []
+        self._still_ends: list[float] = []
         self._same_since = 0
 
+        # Only the last still segment can change. The ones before it are
+        # merged once, and kept merged here.
+        self._num_merged = 0
+        self._open_segment: tuple[float, float] | None = None
+        self._closed_bad_segments: list[BadSegment] = []
+
     def report_frame(self, time: float, is_same: bool) -> None:
         if not is_same:
             self._same_since = time
             return
 
-        if self._still_segments:
-            last_sgement = self._still_segments[-1]
-            if last_sgement[0] == self._same_since:
-                self._still_segments.pop()
+        if self._still_starts and self._still_starts[-1] == self._same_since:
+            self._still_ends[-1] = time
+            return
 
-        still_segment = (self._same_since, time)
-        self._still_segments.append(still_segment)
+        self._still_starts.append(self._same_since)
+        self._still_ends.append(time)
 
     def get_bad_segments(self) -> list[BadSegment]:
-
-        # First remove small choppy segments.
-        long_choppy_segments = (
-            segment
-            for segment in self._still_segments
-            if segment[1] - segment[0] > _STUTTER_THRESHOLD
+        while self._num_merged < len(self._still_starts) - 1:
+            i = self._num_merged
+            self._open_segment, closed_segment = _merge_still_segment(
+                self._open_segment, (self._still_starts[i], self._still_ends[i])
+            )
+            self._closed_bad_segments += _to_bad_segments([closed_segment])
+            self._num_merged += 1
+
+        open_segment, closed_segment = self._open_segment, None
+        if self._still_starts:
+            open_segment, closed_segment = _merge_still_segment(
+                open_segment, (self._still_starts[-1], self._still_ends[-1])
+            )
+        return self._closed_bad_segments + _to_bad_segments(
+            [closed_segment, open_segment]
         )
 
-        # Then merge segments with short gaps of non-choppiness.
-        processed_segments: list[tuple[float, float]] = []
-        for segment in long_choppy_segments:
-            if processed_segments:
-                last_segment = processed_segments[-1]
-                # Check if the gap of non-choppiness is too small.
-                if segment[0] - last_segment[1] <= _NON_STILL_TIME_THRESHOLD:
-                    # Merge with previous.
-                    segment = (last_segment[0], segment[1])
-                    # Drop the last segment, as we will add merged segment.
-                    processed_segments.pop()
-
-            processed_segments.append(segment)
-
-        # Then drop all the short choppy sections.
-        processed_segments = [
-            segment
-            for segment in processed_segments
-            if segment[1] - segment[0] > _CHOPPINESS_LENGTH_THRESHOLD
-        ]
-
-        return [
-            {
-                "interval": segment,
-                "reason": "choppiness",
-            }
-            for segment in processed_segments
-        ]
-
 
 class VideoQualityProfiler(process_node.ProcessNode):
     @override
@@ -93,36 +156,53 @@ class VideoQualityProfiler(process_node.ProcessNode):
         source_file: str,
         out_file_stem: str,
     ) -> str:
-        clip = moviepy.VideoFileClip(source_file)
+        # Decoded directly with OpenCV. Frames stay in BGR, since the channel
+        # order does not matter for comparing them.
+        cap = cv2.VideoCapture(source_file)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open {source_file!r}")
+        fps: float = cap.get(cv2.CAP_PROP_FPS)
+        # Only for logging. OpenCV estimates the frame count, so it is approximate.
+        approx_duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
 
         choppiness = _ChoppinessDetector()
 
         last_frame: npt.NDArray[np.uint8] | None = None
+        # Frames are decoded alternately into these, so that the previous frame
+        # stays intact without allocating a new array for every frame.
+        frame_buffers: list[npt.NDArray[np.uint8] | None] = [None, None]
 
-        frame_time: np.float64
         frame: npt.NDArray[np.uint8]
         start_time = time.time()
-        for frame_count, (frame_time, frame) in enumerate(
-            clip.iter_frames(with_times=True)
-        ):
-            if last_frame is not None:
-                # Check if the video frames are the same or very similar.
-                # Compute RMSE.
-                rmse = ((frame - last_frame) ** 2).mean() ** 0.5
-                choppiness.report_frame(
-                    float(frame_time), is_same=rmse < _RMSE_THRESHOLD
-                )
-                if frame_count % 100 == 0:
-                    speed_factor = frame_time / max(time.time() - start_time, 0.001)
-                    logging.info(
-                        f"frame: {frame_count} time: {frame_time:0.2f}/{clip.duration}"
-                        f" Speed: {speed_factor:0.2f}x Last RMSE: {rmse:0.5f}"
+        try:
+            for frame_count in itertools.count():
+                ok, frame = cap.read(frame_buffers[frame_count % 2])
+                if not ok:
+                    break
+                frame_buffers[frame_count % 2] = frame
+                # Same as the times from moviepy's iter_frames().
+                frame_time = frame_count / fps
+                if last_frame is not None:
+                    # Check if the video frames are the same or very similar.
+                    choppiness.report_frame(
+                        frame_time, is_same=_is_same_frame(frame, last_frame)
                     )
-                    segements_for_logging = choppiness.get_bad_segments()
-                    if segements_for_logging:
-                        logging.info(f"So far: {segements_for_logging}")
-
-            last_frame = frame
+                    if frame_count % 100 == 0:
+                        rmse = _rmse(frame, last_frame)
+                        speed_factor = frame_time / max(time.time() - start_time, 0.001)
+                        logging.info(
+                            f"frame: {frame_count} time: {frame_time:0.2f}/~{approx_duration:0.2f}"
+                            f" Speed: {speed_factor:0.2f}x Last RMSE: {rmse:0.5f}"
+                        )
+                        segements_for_logging = choppiness.get_bad_segments()
+                        if segements_for_logging:
+                            logging.info(
+                                f"So far: {len(segements_for_logging)}, last: {segements_for_logging[-1]}"
+                            )
+
+                last_frame = frame
+        finally:
+            cap.release()
 
         out_file = out_file_stem + ".inadmissible_video_segments.json"
         with open(out_file, "w") as f:
@@ -6,15 +6,18 @@
 #
 # So temp dir should be cleared if VERSION changes for a clean run.
 #
+import bisect
+from concurrent import futures
 import hashlib
 import json
 import logging
 import os
 import random
+import time
 
-import moviepy  # type: ignore
 from numpy import typing as npt
 import numpy as np
+import orjson
 from PIL import Image
 import pydantic
 
@@ -25,6 +28,7 @@ from ...flow import process_node
 from ..llm_service import abstract_llm
 from ..llm_service import llm_utils
 from ..llm_service import vision
+from ..utils import frame_reader
 from ..utils import interval_scanner
 from ..utils import manual_labels_manager
 from ..utils import misc_utils
@@ -42,6 +46,12 @@ _CAPTION_SECS = 30.0
 # Probability of logging VLM calls.
 _LOG_PROBABILITY = 0.05
 
+# The partial work is saved after these many frames, or these many seconds,
+# whichever comes first. Calls lost to an interruption in between are still in
+# the LLM cache.
+_SAVE_EVERY_FRAMES = 10
+_SAVE_EVERY_S = 30.0
+
 
 class SceneDescriptionT(pydantic.BaseModel):
     time: float
@@ -59,8 +69,12 @@ class SceneListT(pydantic.BaseModel):
     chronology: list[SceneDescriptionT]
 
 
-def _sha_256(s: str) -> str:
-    return hashlib.sha256(s.encode()).hexdigest()[:10]
+def _context_hash(prompt: str, image: Image.Image) -> str:
+    # Hashes the raw pixels, so that the image need not be encoded for this.
+    sha = hashlib.sha256(prompt.encode())
+    sha.update(f"{image.mode} {image.size}".encode())
+    sha.update(image.tobytes())
+    return sha.hexdigest()[:10]
 
 
 def _get_caption_lines(
@@ -72,6 +86,17 @@ def _get_caption_lines(
     chronology_index = -1
 
     if captions:
+        # Scenes this much before the earliest caption are never shown. Skip them
+        # without a scan, since the chronology grows with every frame.
+        earliest_start = min(caption["interval"][0] for caption in captions)
+        chronology_index = (
+            bisect.bisect_left(
+                chronology,
+                earliest_start - _CAPTION_SECS,
+                key=lambda scene: scene.time,
+            )
+            - 1
+        )
         lines += [
             "",
             "For additional context, below is an excerpt of conversation immediately before this frame -",
@@ -156,7 +181,9 @@ class _VisionProcessor:
 
         self._out_file_stem = out_file_stem
 
-        self._clip = moviepy.VideoFileClip(movie_path)
+        # Frames on the grid are read by decoding forward, or seeking, whichever
+        # is faster on this video.
+        self._frames = frame_reader.FrameReader(movie_path)
 
         labels = manual_labels_manager.VideoAnnotation(movie_path)
         self._student_labels = labels.get_student_scanner()
@@ -165,7 +192,7 @@ class _VisionProcessor:
             model=vision_model.model_description(), chronology=[]
         )
 
-        self._caption_scanner = interval_scanner.IntervalScanner(role_aware_summary)
+        self._caption_scanner = interval_scanner.IntervalIndex(role_aware_summary)
 
         # If a partial output file exists, load it and delete it. We will use it
         # as a cache.
@@ -174,28 +201,50 @@ class _VisionProcessor:
             "_vision_processor." + os.path.basename(self._out_file_stem) + ".partial"
         )
         self._partial_load()
+        # Number of scenes in the partial file, or None if it is not started.
+        self._num_saved: int | None = None
 
+    # The partial file has one JSON per line. The first line has the model, and
+    # each following line is a scene. Saves append only the new scenes.
     def _partial_load(self) -> None:
         if os.path.exists(self._partial_file):
             logging.info(f"Partial file found: {self._partial_file}. Loading...")
-            with open(self._partial_file, "r") as file:
-                scenes = SceneListT.model_validate_json(file.read())
-            if scenes.model != self._scene_descriptions.model:
+            with open(self._partial_file, "rb") as file:
+                lines = file.read().splitlines()
+            try:
+                model = orjson.loads(lines[0])["model"]
+            except (IndexError, KeyError, TypeError, orjson.JSONDecodeError):
+                logging.warning(f"Ignoring unrecognized {self._partial_file}.")
+                return
+            if model != self._scene_descriptions.model:
                 # Do not use results if the model has changed since then.
                 return
-            for scene in scenes.chronology:
+            for line in lines[1:]:
+                try:
+                    scene = SceneDescriptionT.model_validate_json(line)
+                except pydantic.ValidationError:
+                    # The last line may be incomplete, if a save was interrupted.
+                    logging.warning(f"Ignoring unparseable partial scene: {line!r}")
+                    continue
                 self._prior_work[scene.context_hash] = scene
             os.remove(self._partial_file)
 
     def _partial_save(self) -> None:
         logging.info(f"Saving to {self._partial_file!r}.")
-        with open(self._partial_file, "w") as file:
-            file.write(self._scene_descriptions.model_dump_json(indent=2))
+        chronology = self._scene_descriptions.chronology
+        if self._num_saved is None:
+            with open(self._partial_file, "wb") as file:
+                file.write(orjson.dumps({"model": self._scene_descriptions.model}))
+                file.write(b"\n")
+            self._num_saved = 0
+        with open(self._partial_file, "a") as file:
+            for scene in chronology[self._num_saved :]:
+                file.write(scene.model_dump_json() + "\n")
+        self._num_saved = len(chronology)
 
     def process(self) -> str:
         t = 5.0
-        clip_duration: Any = self._clip.duration
-        assert isinstance(clip_duration, float)
+        clip_duration = self._frames.duration
 
         # Create a subdirectory for each call.
         log_dir = misc_utils.file_stem_to_log_stem(self._out_file_stem)
@@ -204,20 +253,49 @@ class _VisionProcessor:
         os.makedirs(log_dir, exist_ok=True)
         logging.info(f"Logging VLM calls to: {log_dir!r}")
 
+        times: list[float] = []
         while t < clip_duration - _RESOLUTION_S:
-            self._process_frame(t, log_dir)
-            self._partial_save()
+            times.append(t)
             t += _RESOLUTION_S
 
-        # We're done. Rename the partial save to actual save.
+        # The student window of the next frame is decoded and detected while the
+        # VLM call for the current frame is in flight. The calls themselves stay
+        # sequential, since each prompt includes the previous frame's result.
+        try:
+            with futures.ThreadPoolExecutor(max_workers=1) as executor:
+                next_image: futures.Future[Image.Image | None] | None = None
+                if times:
+                    next_image = executor.submit(self._student_image, times[0])
+                last_save_time = time.monotonic()
+                for index, t in enumerate(times):
+                    assert next_image is not None
+                    student_image = next_image.result()
+                    if index + 1 < len(times):
+                        next_image = executor.submit(
+                            self._student_image, times[index + 1]
+                        )
+                    if student_image is not None:
+                        self._process_frame(t, student_image, log_dir)
+                    if (
+                        index % _SAVE_EVERY_FRAMES == _SAVE_EVERY_FRAMES - 1
+                        or time.monotonic() - last_save_time > _SAVE_EVERY_S
+                    ):
+                        self._partial_save()
+                        last_save_time = time.monotonic()
+        finally:
+            self._frames.close()
+            # Also keeps the work done so far, if interrupted.
+            self._partial_save()
+
+        # We're done. Write the actual save, and remove the partial one.
 
         # Since this will be a costly operation, preserve the previous outputs.
         # Create a new file every time an output is ready.
         outfname = f"{self._out_file_stem}.scene_understanding_{self._timestamp}.json"
-        if os.path.exists(outfname):
-            os.remove(outfname)
-        os.rename(self._partial_file, outfname)
-        logging.info(f"Saved from partial to: {outfname}")
+        with open(outfname, "w") as file:
+            file.write(self._scene_descriptions.model_dump_json(indent=2))
+        os.remove(self._partial_file)
+        logging.info(f"Saved to: {outfname}")
         return outfname
 
     def _crop_to_windows(
@@ -237,22 +315,25 @@ class _VisionProcessor:
 
         return self._yolo_detector.crop_to_detections(image, f"{t=}")
 
-    def _process_frame(self, t: float, log_dir: str) -> None:
-        frame = self._clip.get_frame(t)
-        if frame is None:
+    def _student_image(self, t: float) -> Image.Image | None:
+        try:
+            frame = self._frames.get_frame(t)
+        except ValueError:
             logging.warning(f"Could not find frame at {t}.")
             return None
         cropped = self._crop_to_windows(frame, t)
         student_image = cropped.get(yolo_window_detector.DetectionType.STUDENT)
         if student_image is None:
             logging.warning(f"Could not find student window at {t}.")
-            return None
+        return student_image
 
+    def _process_frame(
+        self, t: float, student_image: Image.Image, log_dir: str
+    ) -> None:
         captions = self._caption_scanner.overlapping_intervals(t - _CAPTION_SECS, t)
         prompt = _get_prompt(self._source_movie, captions, self._scene_descriptions)
 
-        image_b64 = vision.to_base64(student_image)
-        context_hash = _sha_256(prompt + image_b64)
+        context_hash = _context_hash(prompt, student_image)
 
         # Skip if we are re-running the process and there is a hit from previous partial file.
         if context_hash in self._prior_work:
@@ -264,6 +345,7 @@ class _VisionProcessor:
                 )
                 return
 
+        image_b64 = vision.to_base64(student_image)
         call_count = len(self._scene_descriptions.chronology)
 
         if random.random() < _LOG_PROBABILITY:
@@ -293,6 +375,7 @@ class _VisionProcessor:
             image_b64=image_b64,
             transformers=[llm_utils.parse_as_json, validate_as_list],
             log_file=log_file,
+            cache_dir=video_config.LLM_CACHE_DIR,
         )
         self._scene_descriptions.chronology.append(result)
 
@@ -305,9 +388,9 @@ class VisionProcess(process_node.ProcessNode):
     def process(
         self, source_file: str, role_aware_summary_file: str, out_file_stem: str
     ) -> str:
-        with open(role_aware_summary_file, "r") as file:
+        with open(role_aware_summary_file, "rb") as file:
             role_aware_summary: list[role_based_captioner.RoleAwareCaptionT] = (
-                json.load(file)
+                orjson.loads(file.read())
             )
         processor = _VisionProcessor(
             vision_model=self._model,
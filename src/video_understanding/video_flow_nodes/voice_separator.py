@@ -1,11 +1,16 @@
+from collections.abc import Generator
 import contextlib
-import json
+import hashlib
 import logging
 import os
+import pathlib
 import subprocess
+import tempfile
 
+import orjson
 from pyannote import audio  # type: ignore
 import pydantic
+import soundfile  # type: ignore
 import torch
 
 from .. import video_config
@@ -28,30 +33,73 @@ class _Diarization(pydantic.BaseModel):
 DiarizationListT = pydantic.RootModel[list[_Diarization]]
 
 
+# Arguments for the WAV given to the models, i.e. 16kHz mono PCM.
+_WAV_FFMPEG_ARGS = ["-acodec", "pcm_s16le", "-ac", "1", "-ar", "16000"]
+
+# Least recently used WAVs are removed beyond this total size.
+_MAX_WAV_CACHE_BYTES = 4 << 30
+
+
+def _evict_wav_cache(cache_dir: pathlib.Path) -> None:
+    # Most recently used first. The first is always kept, since it is in use.
+    wav_files = sorted(
+        cache_dir.glob("*.wav"), key=lambda x: x.stat().st_mtime, reverse=True
+    )
+    total_bytes = 0
+    for index, wav_file in enumerate(wav_files):
+        total_bytes += wav_file.stat().st_size
+        if index > 0 and total_bytes > _MAX_WAV_CACHE_BYTES:
+            logging.info(f"Evicting cached {wav_file}")
+            wav_file.unlink(missing_ok=True)
+
+
 @contextlib.contextmanager
-def get_wav(source_file: str):
-    out_file = None
-    try:
-        out_file = video_config.random_temp_fname("_wav_temp", ".wav")
-        command = [
-            "ffmpeg",
-            "-y",
-            "-i",
-            source_file,
-            "-acodec",
-            "pcm_s16le",
-            "-ac",
-            "1",  # Single channel
-            "-ar",
-            "16000",  # Sample rate 16kHz
-            out_file,
-        ]
-        subprocess.run(command, check=True)
-        yield out_file
-    finally:
-        if out_file is not None:
-            os.remove(out_file)
-            logging.info(f"Removed {out_file!r}")
+def get_wav(source_file: str) -> Generator[str, None, None]:
+    """Yields a WAV with the audio of the source file.
+
+    The WAV is cached, keyed by the source file and its modification time. So
+    all nodes processing the same source extract the audio once.
+    """
+    stat = os.stat(source_file)
+    cache_key = "|".join(
+        [os.path.realpath(source_file), str(stat.st_mtime_ns), str(stat.st_size)]
+        + _WAV_FFMPEG_ARGS
+    )
+    cache_dir = video_config.WAV_CACHE_DIR
+    out_file = cache_dir / f"{hashlib.sha256(cache_key.encode()).hexdigest()}.wav"
+    if out_file.exists():
+        logging.info(f"Using cached {out_file}")
+        # Mark as recently used.
+        os.utime(out_file)
+    else:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write and rename, so that an interrupted extraction is not cached.
+        temp_fd, temp_file = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        os.close(temp_fd)
+        try:
+            command = [
+                "ffmpeg",
+                "-y",
+                # Only report errors, instead of progress for every frame.
+                "-loglevel",
+                "error",
+                "-i",
+                source_file,
+                *_WAV_FFMPEG_ARGS,
+                "-f",
+                "wav",
+                temp_file,
+            ]
+            # Detach stdin, so that ffmpeg does not wait on or consume the terminal.
+            subprocess.run(
+                command, check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL
+            )
+            os.replace(temp_file, out_file)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        _evict_wav_cache(cache_dir)
+    yield str(out_file)
 
 
 class VoiceSeparator(process_node.ProcessNode):
@@ -78,7 +126,23 @@ class VoiceSeparator(process_node.ProcessNode):
             max_speakers = 3
 
         with get_wav(source_file) as source_wav:
-            diarization = self._pipeline(source_wav, max_speakers=max_speakers)
+            samples, sample_rate = soundfile.read(source_wav, dtype="float32")
+        # Passed in memory, so that the pipeline does not re-read the file for
+        # each of its sliding windows.
+        waveform = torch.from_numpy(samples).unsqueeze(0)
+        # The pipeline runs its models on fixed-size sliding windows, so cuDNN
+        # can pick the fastest kernels once and reuse them. The flag is global,
+        # so it is restored for the other nodes.
+        cudnn_benchmark = torch.backends.cudnn.benchmark
+        torch.backends.cudnn.benchmark = True
+        try:
+            with torch.inference_mode():
+                diarization = self._pipeline(
+                    {"waveform": waveform, "sample_rate": sample_rate},
+                    max_speakers=max_speakers,
+                )
+        finally:
+            torch.backends.cudnn.benchmark = cudnn_benchmark
 
         result = []
         seen_speakers: set[str] = set()
@@ -93,9 +157,9 @@ class VoiceSeparator(process_node.ProcessNode):
 
         logging.info(f"Seen speakers: {seen_speakers} with {max_speakers=}.")
 
-        # Validate.
-        all(_Diarization.model_validate(x) for x in result)
+        # Validate, in one call for the whole list.
+        DiarizationListT.model_validate(result)
 
-        with open(out_file, "w") as f:
-            json.dump(result, f)
+        with open(out_file, "wb") as f:
+            f.write(orjson.dumps(result))
         return out_file
@@ -1,15 +1,6 @@
-import dataclasses
-
 from typing import Any
 
 
-@dataclasses.dataclass
-class _CaptionedText:
-    words: list[str]
-    interval: tuple[float, float]
-    speaker: str
-
-
 def merge_word_captions(
     word_captions: list[dict[str, Any]],
     speaker_aliases: dict[str, str] | None,
@@ -19,7 +10,12 @@ def merge_word_captions(
 
     If and as the speaker changes in words, new lines are added.
     """
-    by_speaker: list[_CaptionedText] = []
+    # Speakers, texts and intervals of all words.
+    speakers: list[str] = []
+    texts: list[str] = []
+    intervals: list[tuple[float, float]] = []
+    # Indices of the words which start a new line.
+    line_starts: list[int] = []
     for segment in word_captions:
 
         # Note: For forcing a break after a segment.
@@ -35,40 +31,28 @@ def merge_word_captions(
             elif speaker_aliases is not None:
                 speaker = speaker_aliases[speaker]
 
-            if new_segment:
-                last_speaker = None
+            if new_segment or speaker != speakers[-1]:
+                line_starts.append(len(speakers))
                 new_segment = False
-            else:
-                last_speaker = by_speaker[-1].speaker if by_speaker else None
-            if speaker != last_speaker:
-                by_speaker.append(
-                    _CaptionedText(
-                        words=[],
-                        interval=word["interval"],
-                        speaker=speaker,
-                    )
-                )
 
-            by_speaker[-1].words.append(word["text"])
-            by_speaker[-1].interval = (by_speaker[-1].interval[0], word["interval"][1])
+            speakers.append(speaker)
+            texts.append(word["text"])
+            intervals.append(word["interval"])
 
     # Convert to our standard dictionary format.
+    line_ends = line_starts[1:] + [len(speakers)]
     return [
         {
-            "speaker": item.speaker,
-            "text": " ".join(item.words),
-            "interval": item.interval,
+            "speaker": speakers[start],
+            "text": " ".join(texts[start:end]),
+            "interval": (intervals[start][0], intervals[end - 1][1]),
         }
-        for item in by_speaker
+        for start, end in zip(line_starts, line_ends)
     ]
 
 
 def all_speakers(captions: list[dict[str, Any]]) -> list[str]:
     """Get all unique speakers from the captions."""
-    speakers = set()
-    for caption in captions:
-        for word in caption["words"]:
-            speakers.add(word["speaker"])
-    if "" in speakers:
-        speakers.remove("")
+    speakers = {word["speaker"] for caption in captions for word in caption["words"]}
+    speakers.discard("")
     return sorted(speakers)
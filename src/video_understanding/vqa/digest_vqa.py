@@ -4,8 +4,10 @@ from .. import video_flow_graph
 from ..llm_service import abstract_llm
 from ..llm_service import llm
 from ..llm_service import llm_utils
+from ..utils import misc_utils
 from ..utils import prompt_utils
 from ..utils import templater
+from ..video_flow_nodes import role_based_captioner
 from ..video_flow_nodes import video_flow_types
 
 from typing import override
@@ -30,7 +32,11 @@ class DigestVqa(abstract_vqa.AbstractVqa):
             )
         self._scene_understanding = scene_understanding
 
-        self._role_aware_caption = graph.role_aware_captions()
+        self._role_aware_caption = (
+            role_based_captioner.RoleAwareCaptionsSoA.from_captions(
+                graph.role_aware_captions()
+            )
+        )
 
         # Use self._loaded_model instead of directly accessing this.
         self._model: abstract_llm.AbstractLlm | None = None
@@ -38,6 +44,14 @@ class DigestVqa(abstract_vqa.AbstractVqa):
         # Keep a buffer of things that happened for context.
         self._history: list[tuple[float, str]] = []
 
+        # Rendered caption lines keyed by the question time, since follow-up
+        # questions are usually asked at the same time.
+        self._caption_cache: dict[float, str] = {}
+
+        # The captions lead the prompt, and only grow with the question time.
+        # So all prompts for this video share a prefix for the provider to cache.
+        self._prompt_cache_key = misc_utils.fingerprint(video_path)
+
     @property
     def _loaded_model(self) -> abstract_llm.AbstractLlm:
         """Lazily instantiate and return the model."""
@@ -49,17 +63,22 @@ class DigestVqa(abstract_vqa.AbstractVqa):
     def ask(self, time: float, question: str) -> str:
         assert self._role_aware_caption is not None
 
-        caption_for_prompt = prompt_utils.caption_lines_for_prompt(
-            self._video_path,
-            self._role_aware_caption,
-            self._scene_understanding,
-            end=time,
-        )
+        caption_for_prompt = self._caption_cache.get(time)
+        if caption_for_prompt is None:
+            caption_for_prompt = "\n".join(
+                prompt_utils.caption_lines_for_prompt(
+                    self._video_path,
+                    self._role_aware_caption,
+                    self._scene_understanding,
+                    end=time,
+                )
+            )
+            self._caption_cache[time] = caption_for_prompt
 
         prompt: list[str] = templater.fill(
             prompt_templates.DIGEST_VQA_PROMPT_TEMPLATE,
             {
-                "caption_lines": "\n".join(caption_for_prompt),
+                "caption_lines": caption_for_prompt,
                 "history": "\n".join(x[1] for x in self._history),
                 "question": question,
             },
@@ -69,6 +88,7 @@ class DigestVqa(abstract_vqa.AbstractVqa):
             "\n".join(prompt),
             transformers=[llm_utils.remove_thinking],
             max_tokens=4096,
+            prompt_cache_key=self._prompt_cache_key,
         )
 
         if self._maintain_context:
@@ -1,9 +1,28 @@
 import argparse
 import os
+import sys
 
 from .vqa import abstract_vqa
 from .vqa import digest_vqa
 
+from typing import Iterator
+
+
+def _user_inputs() -> Iterator[str]:
+    """Yields the lines entered, until end of input."""
+    if not sys.stdin.isatty():
+        # Piped input, e.g. from a script. Read lines directly, without prompts.
+        for line in sys.stdin:
+            yield line.rstrip("\n")
+        return
+
+    while True:
+        print()
+        try:
+            yield input("$ ")
+        except EOFError:  # Ctrl+D
+            return
+
 
 def _start_question_cli(vqa: abstract_vqa.AbstractVqa):
     current_time: float | None = None
@@ -12,12 +31,9 @@ def _start_question_cli(vqa: abstract_vqa.AbstractVqa):
     print(
         "Example input: ':300' to set time to 300 seconds or 'What is the student doing?' to ask a question."
     )
-    while True:
-        print()
-        try:
-            user_input = input("$ ")
-        except EOFError:  # Ctrl+D
-            break
+    for user_input in _user_inputs():
+        if not user_input:
+            continue
 
         if user_input.startswith(":"):
             # Set time.
@@ -28,7 +44,7 @@ def _start_question_cli(vqa: abstract_vqa.AbstractVqa):
             except ValueError:
                 print("Invalid time format.")
                 continue
-        elif user_input:
+        else:
             # Question.
             if current_time is None:
                 print("Please set a time first using ':TIME'.")